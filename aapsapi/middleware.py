@@ -0,0 +1,130 @@
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Niveles de compresión por tipo de contenido, para respuestas completas (`gzip`, `br`) y por partes (`stream_gzip`, `stream_br`).
+# Sólo se comprimen los datos de la API: las páginas HTML (con el token CSRF) no se comprimen para evitar ataques del tipo BREACH.
+DEFAULT_LEVELS = {
+    'application/json': {'gzip': 6, 'br': 6, 'stream_gzip': 5, 'stream_br': 4},
+    'application/geo+json': {'gzip': 6, 'br': 6, 'stream_gzip': 5, 'stream_br': 4},
+    'application/vnd.geo+json': {'gzip': 6, 'br': 6, 'stream_gzip': 5, 'stream_br': 4},
+    'application/x-ndjson': {'gzip': 6, 'br': 6, 'stream_gzip': 5, 'stream_br': 4},
+    'text/csv': {'gzip': 6, 'br': 6, 'stream_gzip': 5, 'stream_br': 4},
+    'application/vnd.apache.arrow.stream': {'gzip': 4, 'br': 4, 'stream_gzip': 4, 'stream_br': 3},
+}
+DEFAULT_MIN_SIZE = 1024
+
+
+def parse_accept_encoding(header):
+    '''
+    Retorna los pesos `q` de cada codificación del header `Accept-Encoding`.
+    '''
+    weights = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    return weights
+
+
+def negotiate_encoding(header):
+    weights = parse_accept_encoding(header)
+    available = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def gzip_compressor(level):
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def compress(content, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(content, quality=level)
+    compressor = gzip_compressor(level)
+    return compressor.compress(content) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, level):
+    '''
+    Comprime una respuesta por partes, enviando cada parte comprimida apenas es producida.
+    '''
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = gzip_compressor(level)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    '''
+    Comprime las respuestas con brotli (si el paquete está instalado) o gzip según el header `Accept-Encoding` del pedido.
+
+    Sólo se comprimen los tipos de contenido de `COMPRESSION_LEVELS`, cada uno con su propio nivel de compresión, y las respuestas
+    completas de al menos `COMPRESSION_MIN_SIZE` bytes. Las respuestas por partes (`StreamingHttpResponse`) se comprimen parte por parte.
+    '''
+    def __init__(self, get_response=None):
+        super(CompressionMiddleware, self).__init__(get_response)
+        self.levels = getattr(settings, 'COMPRESSION_LEVELS', DEFAULT_LEVELS)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        levels = self.levels.get(content_type)
+        if levels is None:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            level = levels['stream_' + encoding]
+            response.streaming_content = compress_stream(response.streaming_content, encoding, level)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding, levels[encoding])
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(response.content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
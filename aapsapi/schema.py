@@ -0,0 +1,121 @@
+import hashlib
+import os
+import threading
+import coreapi
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework.schemas import SchemaGenerator
+
+API_INFO = openapi.Info(
+    title="AAPS API",
+    default_version='v1',
+    description="API privada - Diseñada para ofrecer puntos de acceso al sistema de información de la AAPS (Bolivia).",
+    # terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="sergio.chumacero.fi@gmail.com"),
+    # license=openapi.License(name="No especificada"),
+)
+
+DOCS_TITLE = 'AAPS-API'
+DOCS_DESCRIPTION = '''
+Sistema REST API privado de la AAPS. 
+Ofrece puntos de acceso a datos de EPSA, Variables, Indicadores, POAs, PDQs, PTDs y áreas de cobertura de las EPSA reguladas.
+Esta página muestra los puntos de acceso y su uso de manera interactiva. 
+Desde acá, es posible explorar y realizar pedidos al sistema.
+
+Los pedidos al sistema deben contar con credenciales de autenticación básica o un header llamado "Authorization" con el Token de autenticación proveido por el sistema, por ejemplo,
+
+    Authorization: Token <Token proveido por el sistema>
+
+Los Tokens de autenticación son proevidos por el sistema a través del punto de acceso `/api-token-auth/` descrito en esta documentación.
+
+La especificación del tipo "Swagger":
+
+[https://aaps-data.appspot.com/swagger](https://aaps-data.appspot.com/swagger/) 
+
+ofrece más información acerca de los modelos de datos del sistema.
+'''
+
+
+def build_openapi():
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+ARTIFACTS = {
+    'openapi.json': build_openapi,
+}
+_loaded = {}
+_lock = threading.Lock()
+
+
+def artifact_path(name):
+    return os.path.join(settings.SCHEMA_DIR, name)
+
+
+def write_artifact(name):
+    '''
+    Genera el esquema `name` y lo guarda en `SCHEMA_DIR`, reemplazando el archivo anterior de manera atómica.
+    '''
+    content = ARTIFACTS[name]()
+    path = artifact_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+    return path
+
+
+def load_artifact(name):
+    '''
+    Contenido y ETag del esquema `name`, leído del archivo una sola vez por proceso. Si el archivo no existe, se genera.
+    '''
+    if name not in _loaded:
+        path = artifact_path(name)
+        if not os.path.exists(path):
+            write_artifact(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        _loaded[name] = (content, '"' + hashlib.md5(content).hexdigest() + '"')
+    return _loaded[name]
+
+
+def openapi_view(request):
+    '''
+    Retorna la especificación OpenAPI guardada, con su ETag para que los navegadores sólo la descarguen cuando cambia.
+    '''
+    content, etag = load_artifact('openapi.json')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def coreapi_document():
+    '''
+    Esquema coreapi de `/docs/`, generado una sola vez por proceso y guardado sólo en memoria.
+    '''
+    with _lock:
+        if 'document' not in _loaded:
+            _loaded['document'] = SchemaGenerator(title=DOCS_TITLE, description=DOCS_DESCRIPTION).get_schema(request=None, public=True)
+    return _loaded['document']
+
+
+class ArtifactSchemaGenerator(SchemaGenerator):
+    '''
+    Generador de `/docs/` que retorna el esquema coreapi ya generado en lugar de recorrer los puntos de acceso en cada pedido.
+    '''
+    def get_schema(self, request=None, public=False):
+        document = coreapi_document()
+        url = self.url
+        if not url and request is not None:
+            url = request.build_absolute_uri()
+        return coreapi.Document(
+            url=url, title=document.title, description=document.description, media_type=document.media_type, content=document.data
+        )
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DEBUG = True
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'aapsapi.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -101,13 +103,46 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.DjangoModelPermissions',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'performance.authentication.CachedBasicAuthentication',
+        'performance.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'performance.renderers.CSVRenderer',
+    ],
+}
+
+# Las respuestas se guardan en la memoria de cada proceso; las versiones de las tablas se comparten entre procesos (y con los
+# comandos de carga) en archivos. Para compartir también las respuestas se puede usar `FileBasedCache` en `/dev/shm`.
+# `DJANGO_CACHE_VERSIONS_DIR` debe apuntar a un directorio compartido por todos los contenedores que escriben en la base de datos
+# (en docker-compose.yml, el volumen `cache` de `django` y `django_worker`). Si los contenedores corren en distintos servidores,
+# `versions` debe usar un caché compartido, por ejemplo `DatabaseCache` (`manage.py createcachetable`) o Redis.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'performance.cache.ByteLRUCache',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_BYTES': int(os.environ.get('DJANGO_RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))},
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_VERSIONS_DIR', '/tmp/aapsapi_versions'),
+        'TIMEOUT': None,
+    },
 }
+RESPONSE_CACHE = 'responses'
+RESPONSE_CACHE_VERSIONS = 'versions'
+
+# Especificación OpenAPI (`/swagger/`, `/redoc/`) generada por `manage.py build_schema`, fuera del código fuente.
+SCHEMA_DIR = os.environ.get('DJANGO_SCHEMA_DIR', os.path.join(tempfile.gettempdir(), 'aapsapi_schema'))
+SWAGGER_SETTINGS = {'SPEC_URL': 'openapi-schema'}
+REDOC_SETTINGS = {'SPEC_URL': 'openapi-schema'}
 
 SERIALIZATION_MODULES = {'geojson': 'djgeojson.serializers'}
 
@@ -0,0 +1,79 @@
+import gzip
+import json
+from unittest import skipIf
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from aapsapi.middleware import CompressionMiddleware, brotli
+
+BODY = json.dumps([{'epsa': f'EPSA{i}', 'year': 2018, 'v1': i} for i in range(200)]).encode('utf-8')
+
+
+class CompressionMiddlewareTest(SimpleTestCase):
+    def process(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/api/reports/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=BODY, **headers):
+        response = HttpResponse(body, content_type='application/json')
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def test_gzip(self):
+        response = self.process(self.json_response(), 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    @skipIf(brotli is None, 'requiere brotli')
+    def test_negotiation(self):
+        response = self.process(self.json_response(), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), BODY)
+        self.assertEqual(self.process(self.json_response(), 'br;q=0, gzip')['Content-Encoding'], 'gzip')
+        self.assertEqual(self.process(self.json_response(), 'gzip;q=0.5, br;q=0.4')['Content-Encoding'], 'gzip')
+        self.assertEqual(self.process(self.json_response(), '*')['Content-Encoding'], 'br')
+
+    def test_identity(self):
+        for accept_encoding in ('', 'identity', 'gzip;q=0, br;q=0', '*;q=0'):
+            response = self.process(self.json_response(), accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(response.content, BODY)
+
+    def test_min_size(self):
+        response = self.process(self.json_response(b'[]'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+        with override_settings(COMPRESSION_MIN_SIZE=len(BODY) + 1):
+            self.assertFalse(self.process(self.json_response()).has_header('Content-Encoding'))
+
+    def test_skipped_responses(self):
+        encoded = self.process(self.json_response(**{'Content-Encoding': 'gzip'}))
+        self.assertEqual((encoded['Content-Encoding'], encoded.content), ('gzip', BODY))
+        html = self.process(HttpResponse(b'<html>' + BODY + b'</html>', content_type='text/html; charset=utf-8'))
+        self.assertFalse(html.has_header('Content-Encoding'))
+        not_modified = HttpResponse(status=304, content_type='application/json')
+        self.assertFalse(self.process(not_modified).has_header('Content-Encoding'))
+
+    def test_weak_etag(self):
+        self.assertEqual(self.process(self.json_response(ETag='"abc"'))['ETag'], 'W/"abc"')
+        self.assertEqual(self.process(self.json_response(ETag='W/"abc"'))['ETag'], 'W/"abc"')
+        self.assertEqual(self.process(self.json_response(ETag='"abc"'), 'identity')['ETag'], '"abc"')
+
+    def test_streaming(self):
+        chunks = [BODY[i:i + 500] for i in range(0, len(BODY), 500)]
+        response = StreamingHttpResponse(iter(chunks), content_type='text/csv; charset=utf-8')
+        response['Content-Length'] = str(len(BODY))
+        response = self.process(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        parts = list(response.streaming_content)
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(gzip.decompress(b''.join(parts)), BODY)
+
+    @skipIf(brotli is None, 'requiere brotli')
+    def test_streaming_br(self):
+        response = self.process(StreamingHttpResponse(iter([BODY[:1000], BODY[1000:]]), content_type='application/json'), 'br')
+        self.assertEqual(brotli.decompress(b''.join(response.streaming_content)), BODY)
@@ -14,19 +14,13 @@ from rest_framework.documentation import include_docs_urls
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+
+from aapsapi.schema import API_INFO, DOCS_DESCRIPTION, DOCS_TITLE, ArtifactSchemaGenerator, openapi_view
 
 admin.site.site_url = None
 
 schema_view = get_schema_view(
-   openapi.Info(
-      title="AAPS API",
-      default_version='v1',
-      description="API privada - Diseñada para ofrecer puntos de acceso al sistema de información de la AAPS (Bolivia).",
-    #   terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="sergio.chumacero.fi@gmail.com"),
-    #   license=openapi.License(name="No especificada"),
-   ),
+   API_INFO,
    public=True,
    permission_classes=(permissions.AllowAny,),
 )
@@ -41,30 +35,13 @@ router.register('reports', performance_views.VariableReportViewSet)
 router.register('measurements', performance_views.IndicatorMeasurementViewSet)
 router.register('poas', planning_views.POAViewSet)
 router.register('plans', planning_views.PlanViewSet)
-
-docs_description ='''
-Sistema REST API privado de la AAPS. 
-Ofrece puntos de acceso a datos de EPSA, Variables, Indicadores, POAs, PDQs, PTDs y áreas de cobertura de las EPSA reguladas.
-Esta página muestra los puntos de acceso y su uso de manera interactiva. 
-Desde acá, es posible explorar y realizar pedidos al sistema.
-
-Los pedidos al sistema deben contar con credenciales de autenticación básica o un header llamado "Authorization" con el Token de autenticación proveido por el sistema, por ejemplo,
-
-    Authorization: Token <Token proveido por el sistema>
-
-Los Tokens de autenticación son proevidos por el sistema a través del punto de acceso `/api-token-auth/` descrito en esta documentación.
-
-La especificación del tipo "Swagger":
-
-[https://aaps-data.appspot.com/swagger](https://aaps-data.appspot.com/swagger/) 
-
-ofrece más información acerca de los modelos de datos del sistema.
-'''
+router.register('jobs', performance_views.ImportJobViewSet)
 
 docs_view = include_docs_urls(
-    title='AAPS-API',
-    description=docs_description,
+    title=DOCS_TITLE,
+    description=DOCS_DESCRIPTION,
     public=True,
+    generator_class=ArtifactSchemaGenerator,
     permission_classes=[permissions.AllowAny,]
 )
 
@@ -80,6 +57,7 @@ urlpatterns = [
     path('api-token-auth/', views.obtain_auth_token),
 
     path('docs/', docs_view),
+    path('openapi.json', openapi_view, name='openapi-schema'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
 path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
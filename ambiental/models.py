@@ -2,7 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
 from djgeojson.fields import PointField
-from performance.models import EPSA
+from performance.epsa_cache import epsa_state
 
 state_code_to_name = dict(
     LP='La Paz',
@@ -283,11 +283,9 @@ class SARH(models.Model):
     def __str__(self):
         return f'{self.epsa} - {self.user}'
     def get_state(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            state_code = str(rel_epsa[0].state)
-            if state_code in state_code_to_name.keys():
-                return state_code_to_name[state_code]
+        state_code = str(epsa_state(self.epsa))
+        if state_code in state_code_to_name.keys():
+            return state_code_to_name[state_code]
         return ''
     get_state.short_description = 'Departamento'
     def get_sub_subt(self):
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from ambiental import models
 from performance.models import EPSA
+from performance.serializers import CustomListModelSerializer
+from performance.upsert import BulkUpsert, collect_children, replace_children
+from django.db import transaction
 from drf_queryfields import QueryFieldsMixin
 from collections import OrderedDict
 from rest_framework.relations import PKOnlyObject
@@ -15,45 +18,31 @@ class TecnicalDataSupSerializer(QueryFieldsMixin, serializers.ModelSerializer):
         model = models.TecnicalDataSup
         exclude = ('id','sarh',)
 
-class SARHListSerializer(serializers.ListSerializer):
-    def is_valid(self,raise_exception=False):
-        if not hasattr(self, '_validated_data'):
-            self._validated_data = self.initial_data
-            self._errors = {}
-        return True
+class SARHListSerializer(CustomListModelSerializer):
+    nested = {'tecnical_sub': models.TecnicalDataSub, 'tecnical_sup': models.TecnicalDataSup}
 
     def create(self, validated_data):
-        ret = []
+        tecnical_data = []
         for data_dict in validated_data:
-            sarh_id = data_dict.get('sarh_id')
-            sub_list = data_dict.pop('tecnical_sub', None)
-            sup_list = data_dict.pop('tecnical_sup', None)
-
-            if not sarh_id:
-                ret.append({'ignorado':{'no_identificable':'No se proporcionaron todos los campos necesarios para identificar la instancia de manera única.'}})
-                continue
-            qs = models.SARH.objects.filter(sarh_id=sarh_id)
-            if qs.count() > 0:
-                sarh = qs[0]
-                qs.update(**data_dict)
-                ret_key = 'actualizado'
+            if isinstance(data_dict, dict):
+                tecnical_data.append(tuple(
+                    data_list if isinstance(data_list, list) else None
+                    for data_list in (data_dict.pop('tecnical_sub', None), data_dict.pop('tecnical_sup', None))
+                ))
             else:
-                sarh = models.SARH.objects.create(**data_dict)
-                ret_key = 'creado'
-            if sub_list:
-                models.TecnicalDataSub.objects.filter(sarh=sarh).delete()
-                for sub_data in sub_list:
-                    if sub_data.get('sarh'):
-                        del sub_data['sarh']
-                    models.TecnicalDataSub.objects.create(sarh=sarh,**sub_data)
-            if sup_list:
-                models.TecnicalDataSup.objects.filter(sarh=sarh).delete()
-                for sup_data in sup_list:
-                    if sup_data.get('sarh'):
-                        del sup_data['sarh']
-                    models.TecnicalDataSup.objects.create(sarh=sarh,**sup_data)
-            ret.append({ret_key: data_dict})
-        return ret
+                tecnical_data.append((None, None))
+
+        upsert = BulkUpsert(models.SARH, validated_data, ['sarh_id',], batch_size=self.batch_size, errors=self.row_errors)
+        with transaction.atomic():
+            upsert.resolve()
+            sub_data = collect_children(upsert, [sub_list for sub_list, sup_list in tecnical_data], models.TecnicalDataSub, 'sarh', 'tecnical_sub')
+            sup_data = collect_children(upsert, [sup_list for sub_list, sup_list in tecnical_data], models.TecnicalDataSup, 'sarh', 'tecnical_sup')
+            if self.context.get('dry_run'):
+                return upsert.report(diffs=True)
+            upsert.save()
+            replace_children(models.TecnicalDataSub, 'sarh', sub_data, self.batch_size)
+            replace_children(models.TecnicalDataSup, 'sarh', sup_data, self.batch_size)
+        return upsert.report()
 
 
 class SARHSerializer(QueryFieldsMixin, serializers.ModelSerializer):
@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+from performance.cache import response_cache, versions_cache
+from ambiental.models import SARH, TecnicalDataSub
 
-# Create your tests here.
+
+class SARHBulkTest(TransactionTestCase):
+    def setUp(self):
+        response_cache().clear()
+        versions_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@aaps.gob.bo', 'clave'))
+
+    def post(self, rows, url='/api/sarhs/'):
+        return self.client.post(url, rows, format='json').data
+
+    def test_tecnical_data(self):
+        rows = [{'sarh_id': 'S1', 'epsa': 'EPSA1', 'tecnical_sub': [{'year': 2017}, {'year': 2018}]}, {'sarh_id': 'S2'}]
+        report = self.post(rows)
+        self.assertEqual([list(row) for row in report], [['creado'], ['creado']])
+        self.assertEqual(list(SARH.objects.get(sarh_id='S1').tecnical_sub.order_by('year').values_list('year', flat=True)), [2017, 2018])
+
+        report = self.post(rows)
+        self.assertEqual([list(row) for row in report], [['sin_cambios'], ['sin_cambios']])
+
+        report = self.post([{'sarh_id': 'S1', 'tecnical_sub': [{'year': 2019}]}])
+        self.assertIn('actualizado', report[0])
+        self.assertEqual(list(TecnicalDataSub.objects.values_list('year', flat=True)), [2019])
+
+    def test_invalid_rows(self):
+        report = self.post([{'sarh_id': 'S' * 40}, {'epsa': 'EPSA1'}, {'sarh_id': 'S1', 'tecnical_sub': [{'year': 'abc'}]}])
+        self.assertIn('sarh_id', report[0]['ignorado']['invalido'])
+        self.assertIn('no_identificable', report[1]['ignorado'])
+        self.assertEqual(list(report[2]['ignorado']['invalido']['tecnical_sub'][0]), ['year'])
+        self.assertFalse(SARH.objects.exists())
+
+    def test_dry_run(self):
+        self.post([{'sarh_id': 'S1', 'tecnical_sub': [{'year': 2017}]}])
+        response = self.post([{'sarh_id': 'S1', 'tecnical_sub': [{'year': 2018}]}, {'sarh_id': 'S2'}], '/api/sarhs/?dry_run=1')
+        self.assertTrue(response['simulacion'])
+        self.assertIn('tecnical_sub', response['resultados'][0]['cambios'])
+        self.assertIn('creado', response['resultados'][1])
+        self.assertEqual(list(TecnicalDataSub.objects.values_list('year', flat=True)), [2017])
+        self.assertEqual(SARH.objects.count(), 1)
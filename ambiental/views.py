@@ -1,25 +1,51 @@
 from rest_framework import viewsets
 from ambiental import models, serializers
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from performance import jobs
+from performance.pagination import KeysetPagination
+from performance.upsert import DEFAULT_BATCH_SIZE
+from performance.views import FieldProjectionMixin, StreamingListMixin
 from rest_framework import status
 
 class CustomViewSet(viewsets.ModelViewSet):
+    upsert_batch_size = DEFAULT_BATCH_SIZE
+
     def get_serializer(self, *args, **kwargs):
         if isinstance(kwargs.get('data', {}), list):
             kwargs['many'] = True
         return super(CustomViewSet, self).get_serializer(*args, **kwargs)
 
+    def get_serializer_context(self):
+        context = super(CustomViewSet, self).get_serializer_context()
+        context['dry_run'] = jobs.is_dry_run(self.request)
+        context['batch_size'] = self.upsert_batch_size
+        return context
+
     def create(self, request, *args, **kwargs):
+        if jobs.is_dry_run(request):
+            serializer = self.get_serializer(data=request.data if isinstance(request.data, list) else [request.data])
+            serializer.is_valid(raise_exception=False)
+            return Response({'simulacion': True, 'resultados': serializer.save()}, status=status.HTTP_200_OK)
+        if jobs.is_async_request(request):
+            job = jobs.enqueue(request, self.get_serializer_class(), self.get_serializer_context())
+            url = reverse('importjob-detail', kwargs={'pk': job.pk}, request=request)
+            return Response({'job': job.pk, 'status': job.status, 'url': url}, status=status.HTTP_202_ACCEPTED)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=False)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.initial_data)
         return Response(serializer.instance, status=status.HTTP_201_CREATED)
 
-class SARHViewSet(CustomViewSet):
+class SARHViewSet(FieldProjectionMixin, StreamingListMixin, CustomViewSet):
+    '''
+    list:
+    Retorna un conjunto de instancias del modelo `SARH`, en páginas de `page_size` instancias (500 por defecto, hasta 5000) ordenadas por EPSA y usuario. La respuesta contiene los enlaces `next` y `previous` a las páginas siguiente y anterior y la lista `results` de instancias.
+    '''
     serializer_class = serializers.SARHSerializer
-    queryset = models.SARH.objects.all()
+    queryset = models.SARH.objects.prefetch_related('tecnical_sub', 'tecnical_sup')
     filterset_fields = ('epsa',)
+    pagination_class = KeysetPagination
 
 # import json
 # from django.core import serializers
@@ -1,4 +1,5 @@
 python manage.py makemigrations
 python manage.py migrate
 python manage.py runscript -v3 setup
-python manage.py collectstatic --noinput
\ No newline at end of file
+python manage.py collectstatic --noinput
+python manage.py build_schema
\ No newline at end of file
@@ -62,5 +62,14 @@ class IndicatorMeasurementModelAdmin(admin.ModelAdmin):
         extra_context = {'title': 'AAPS - Seguimiento Regulatorio: Medidas de Indicadores'}
         return super(IndicatorMeasurementModelAdmin, self).changelist_view(request, extra_context=extra_context)
 
-
+@admin.register(models.ImportJob)
+class ImportJobModelAdmin(admin.ModelAdmin):
+    view_on_site = False
+    list_filter = ('status',)
+    search_fields = ['serializer',]
+    list_display = ('id', 'serializer', 'user', 'status', 'total_rows', 'processed_rows', 'created', 'heartbeat', 'finished',)
+    exclude = ('payload', 'context',)
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {'title': 'AAPS - Seguimiento Regulatorio: Cargas masivas'}
+        return super(ImportJobModelAdmin, self).changelist_view(request, extra_context=extra_context)
 
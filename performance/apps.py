@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PerformanceConfig(AppConfig):
     name = 'performance'
     verbose_name = 'Seguimiento Regulatorio'
+
+    def ready(self):
+        from performance import signals
+        signals.connect_tombstones()
+        signals.connect_versions()
+        signals.connect_auth_versions()
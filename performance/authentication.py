@@ -0,0 +1,136 @@
+import copy
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.crypto import salted_hmac
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from performance.cache import table_versions, versions_cache
+
+DEFAULT_TTL = 60
+DEFAULT_BASIC_TTL = 60
+DEFAULT_MAX_ENTRIES = 10000
+# Sal aleatoria de cada proceso para los resúmenes de las credenciales verificadas; nunca se guarda ni se comparte.
+CREDENTIALS_SALT = os.urandom(32)
+
+
+class TTLCache:
+    '''
+    Caché en la memoria del proceso con un máximo de `max_entries` entradas, cada una válida por `ttl` segundos.
+    Al superar el máximo se eliminan las entradas usadas hace más tiempo.
+    '''
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expiry, value = entry
+            if expiry <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def auth_cache(ttl_setting='AUTH_CACHE_TTL', default_ttl=DEFAULT_TTL):
+    return TTLCache(
+        getattr(settings, 'AUTH_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+        getattr(settings, ttl_setting, default_ttl),
+    )
+
+
+def credentials_digest(userid, password):
+    message = userid.encode('utf-8') + b'\0' + password.encode('utf-8')
+    return hmac.new(CREDENTIALS_SALT, message, hashlib.sha256).digest()
+
+
+def credentials_key(pk):
+    return f'credentials:{pk}'
+
+
+def credentials_version(user):
+    '''
+    Resumen de lo que decide si las credenciales de `user` siguen siendo válidas: el hash de su contraseña y si está activo.
+    '''
+    return salted_hmac('performance.authentication.credentials', f'{user.password}|{user.is_active}').hexdigest()
+
+
+def store_credentials_version(user):
+    key, version = credentials_key(user.pk), credentials_version(user)
+    transaction.on_commit(lambda: versions_cache().set(key, version, None))
+
+
+def forget_credentials_version(pk):
+    key = credentials_key(pk)
+    transaction.on_commit(lambda: versions_cache().delete(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    `TokenAuthentication` que guarda la resolución token → usuario en la memoria del proceso por `AUTH_CACHE_TTL` segundos
+    (60 por defecto), de modo que los pedidos con un token ya visto no consultan la base de datos (tampoco para los permisos
+    del usuario, que se cargan antes de guardar la resolución). Cada pedido recibe su propia copia del usuario y del token.
+
+    Cada resolución guardada sólo es válida mientras no cambien las versiones de las tablas de tokens y usuarios, que cambian al
+    crear, editar o eliminar un token o un usuario (por ejemplo, al desactivarlo) y al cambiar sus grupos o permisos, también en otros procesos.
+    Los cambios que no envían señales (por ejemplo, `User.objects.filter(...).update(is_active=False)`) no cambian las versiones:
+    un usuario desactivado así sigue autenticado hasta que vence la resolución guardada, a lo sumo `AUTH_CACHE_TTL` segundos.
+    '''
+    cache = auth_cache()
+
+    def authenticate_credentials(self, key):
+        versions = tuple(table_versions([self.get_model(), get_user_model()]))
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == versions:
+            return copy.deepcopy(cached[1])
+        credentials = super(CachedTokenAuthentication, self).authenticate_credentials(key)
+        credentials[0].get_all_permissions()
+        self.cache.set(key, (versions, credentials))
+        return copy.deepcopy(credentials)
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    '''
+    `BasicAuthentication` que evita verificar el hash de la contraseña (PBKDF2) en cada pedido: las credenciales verificadas se
+    guardan por `AUTH_BASIC_CACHE_TTL` segundos sólo como un resumen HMAC-SHA256 con una sal aleatoria del proceso, nunca en texto plano.
+    Cada pedido recibe su propia copia del usuario, sin los permisos cargados.
+
+    Un resumen guardado sólo es válido mientras no cambien el hash de la contraseña del usuario ni su estado activo, según la
+    versión de sus credenciales, que se actualiza al guardar o eliminar el usuario, también en otros procesos. Otros cambios del
+    usuario (por ejemplo, `last_login`) no invalidan el resumen. Las credenciales rechazadas no se guardan.
+    '''
+    cache = auth_cache('AUTH_BASIC_CACHE_TTL', DEFAULT_BASIC_TTL)
+
+    def authenticate_credentials(self, userid, password, request=None):
+        digest = credentials_digest(userid, password)
+        user = self.cache.get(digest)
+        if user is not None and versions_cache().get(credentials_key(user.pk)) == credentials_version(user):
+            return (copy.deepcopy(user), None)
+        user, auth = super(CachedBasicAuthentication, self).authenticate_credentials(userid, password, request)
+        key, version = credentials_key(user.pk), credentials_version(user)
+        versions_cache().add(key, version, None)
+        if versions_cache().get(key) == version:
+            self.cache.set(digest, user)
+        return (copy.deepcopy(user), auth)
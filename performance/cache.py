@@ -0,0 +1,139 @@
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ByteLRUCache(BaseCache):
+    '''
+    Caché en la memoria del proceso limitado por el tamaño total de los valores guardados (`OPTIONS['MAX_BYTES']`) en lugar del
+    número de entradas. Al superar el límite se eliminan las entradas usadas hace más tiempo.
+
+    Cada proceso tiene su propio caché; para compartirlo entre procesos se puede usar `FileBasedCache`, por ejemplo en `/dev/shm`.
+    '''
+    def __init__(self, location, params):
+        super(ByteLRUCache, self).__init__(params)
+        options = params.get('OPTIONS') or {}
+        self.max_bytes = int(params.get('max_bytes', options.get('MAX_BYTES', DEFAULT_MAX_BYTES)))
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.lock:
+            if self._get(key) is not None:
+                return False
+            self._set(key, value, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.lock:
+            entry = self._get(key)
+            if entry is None:
+                return default
+            self.entries.move_to_end(key)
+            data = entry[0]
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.lock:
+            self._set(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        with self.lock:
+            entry = self._get(key)
+            if entry is None:
+                return False
+            self.entries[key] = (entry[0], self.get_backend_timeout(timeout))
+            return True
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.lock:
+            self._delete(key)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self.lock:
+            return self._get(key) is not None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            self._delete(key)
+            return None
+        return entry
+
+    def _set(self, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._delete(key)
+        if len(data) > self.max_bytes:
+            return
+        self.entries[key] = (data, self.get_backend_timeout(timeout))
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            oldest, (oldest_data, expiry) = self.entries.popitem(last=False)
+            self.size -= len(oldest_data)
+
+    def _delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE', 'default')]
+
+
+def versions_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_VERSIONS', getattr(settings, 'RESPONSE_CACHE', 'default'))]
+
+
+def table_versions(models):
+    '''
+    Versiones actuales de las tablas de `models`. Una tabla sin versión guardada recibe una nueva.
+    '''
+    cache = versions_cache()
+    keys = [f'version:{model._meta.label_lower}' for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    '''
+    Cambia la versión de la tabla de `model` al confirmarse la transacción actual, invalidando las respuestas guardadas que dependen de ella.
+    '''
+    key = f'version:{model._meta.label_lower}'
+    transaction.on_commit(lambda: versions_cache().set(key, uuid.uuid4().hex, None))
+
+
+def response_key(request, versions):
+    media_type = getattr(request, 'accepted_media_type', '')
+    key = f'{request.get_host()}{request.path}|{sorted(request.query_params.lists())}|{media_type}|{"|".join(versions)}'
+    return 'response:' + hashlib.md5(key.encode('utf-8')).hexdigest()
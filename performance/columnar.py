@@ -0,0 +1,80 @@
+import io
+from itertools import islice
+from django.db import models
+from rest_framework.exceptions import ValidationError
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+BATCH_SIZE = 10000
+FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def arrow_type(field):
+    if isinstance(field, models.FloatField):
+        return pyarrow.float64()
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return pyarrow.int64()
+    if isinstance(field, models.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field, models.DateTimeField):
+        return pyarrow.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pyarrow.date32()
+    return pyarrow.string()
+
+
+def export_fields(model, names=None):
+    '''
+    Campos concretos del modelo a exportar, opcionalmente limitados a los nombres `names` (en el orden del modelo).
+    Un nombre que no corresponde a ningún campo exportable es un error de validación.
+    '''
+    fields = [field for field in model._meta.concrete_fields if not isinstance(field, models.ForeignKey)]
+    if names:
+        unknown = [name for name in names if name not in {field.name for field in fields}]
+        if unknown:
+            raise ValidationError({'fields': [f'Campo desconocido: {name}.' for name in unknown]})
+        fields = [field for field in fields if field.name in names]
+    return fields
+
+
+def iter_columnar(queryset, fields, output_format, batch_size=BATCH_SIZE):
+    '''
+    Escribe el queryset en formato Arrow IPC (`arrow`) o Parquet (`parquet`) por lotes de `batch_size` filas.
+
+    Las columnas se construyen directamente de `values_list()` sin crear instancias del modelo y los bytes de cada lote
+    se retornan apenas son escritos, por lo que la memoria utilizada depende del tamaño del lote y no del queryset.
+    '''
+    names = [field.name for field in fields]
+    schema = pyarrow.schema([pyarrow.field(field.name, arrow_type(field)) for field in fields])
+    sink = io.BytesIO()
+    if output_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+        write = lambda batch: writer.write_table(pyarrow.Table.from_batches([batch]))
+    else:
+        writer = pyarrow.RecordBatchStreamWriter(sink, schema)
+        write = writer.write_batch
+
+    def flush():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    rows = queryset.values_list(*names).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        columns = zip(*batch)
+        arrays = [pyarrow.array(list(column), type=field.type) for column, field in zip(columns, schema)]
+        write(pyarrow.RecordBatch.from_arrays(arrays, names))
+        yield flush()
+    writer.close()
+    yield flush()
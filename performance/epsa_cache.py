@@ -0,0 +1,48 @@
+import time
+from django.conf import settings
+from performance.cache import table_versions
+
+DEFAULT_CHECK_INTERVAL = 1.0
+
+_epsas = (None, {})
+_checked = 0.0
+
+
+def epsa_metadata():
+    '''
+    Mapa código de EPSA → (categoría, departamento), cargado con una sola consulta y guardado en la memoria del proceso.
+
+    El mapa se recarga cuando cambia la versión de la tabla de EPSAs, que cambia con cada creación, edición o eliminación de una
+    EPSA (señales `post_save`, `post_delete` y `bulk_change`), también si ocurre en otro proceso. La versión se consulta a lo sumo
+    una vez cada `EPSA_CACHE_CHECK_INTERVAL` segundos (1 por defecto), por lo que un cambio puede tardar ese tiempo en verse.
+    '''
+    global _epsas, _checked
+    from performance.models import EPSA
+    loaded_version, epsas = _epsas
+    now = time.monotonic()
+    if loaded_version is not None and now - _checked < getattr(settings, 'EPSA_CACHE_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL):
+        return epsas
+    version = table_versions([EPSA])[0]
+    if loaded_version != version:
+        epsas = {code: (category, state) for code, category, state in EPSA.objects.values_list('code', 'category', 'state')}
+        _epsas = (version, epsas)
+    _checked = now
+    return epsas
+
+
+def epsa_category(code):
+    return epsa_metadata().get(code, (None, None))[0]
+
+
+def epsa_state(code):
+    return epsa_metadata().get(code, (None, None))[1]
+
+
+def epsa_codes(category=None, state=None):
+    '''
+    Códigos de las EPSAs de la categoría `category` y/o del departamento `state`.
+    '''
+    return [
+        code for code, (epsa_category, epsa_state) in epsa_metadata().items()
+        if (category is None or epsa_category == category) and (state is None or epsa_state == state)
+    ]
@@ -0,0 +1,112 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from performance.models import ImportJob
+
+JOB_CHUNK_SIZE = 500
+# Segundos sin actividad después de los cuales una carga `en_proceso` se considera abandonada (por ejemplo, porque el proceso se detuvo).
+DEFAULT_STALE_AFTER = 600
+
+
+def is_async_request(request):
+    return request.query_params.get('async', '').lower() in ('1', 'true') and isinstance(request.data, list)
+
+
+def is_dry_run(request):
+    return request is not None and request.query_params.get('dry_run', '').lower() in ('1', 'true')
+
+
+def enqueue(request, serializer_class, context=None):
+    '''
+    Registra una carga masiva para ser ejecutada por el comando `importworker`.
+    Las opciones simples del contexto del serializador (`context`, por ejemplo `dry_run`) se guardan con la carga.
+    '''
+    user = request.user if request.user and request.user.is_authenticated else None
+    return ImportJob.objects.create(
+        serializer=f'{serializer_class.__module__}.{serializer_class.__name__}',
+        user=user,
+        payload=request.data,
+        total_rows=len(request.data),
+        context={key: value for key, value in (context or {}).items() if isinstance(value, (bool, int, float, str))},
+    )
+
+
+def job_context(job):
+    '''
+    Contexto del serializador de la carga: las opciones guardadas del pedido original, el usuario que la realizó y la carga misma.
+    '''
+    return dict(job.context or {}, user=job.user, job=job)
+
+
+def claim_next_job():
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update(skip_locked=True).filter(status='pendiente').order_by('created').first()
+        if job is not None:
+            job.status = 'en_proceso'
+            job.started = job.heartbeat = timezone.now()
+            job.save(update_fields=['status', 'started', 'heartbeat'])
+    return job
+
+
+def requeue_stale_jobs(stale_after=None):
+    '''
+    Vuelve a poner como pendientes las cargas `en_proceso` sin actividad por más de `stale_after` segundos
+    (`IMPORT_JOB_STALE_AFTER`), que quedaron abandonadas al detenerse el proceso que las ejecutaba.
+    Las cargas se repiten desde el principio: los grupos ya confirmados se reportan como `sin_cambios`.
+    '''
+    if stale_after is None:
+        stale_after = getattr(settings, 'IMPORT_JOB_STALE_AFTER', DEFAULT_STALE_AFTER)
+    limit = timezone.now() - timedelta(seconds=stale_after)
+    return ImportJob.objects.filter(Q(heartbeat__lt=limit) | Q(heartbeat__isnull=True, started__lt=limit), status='en_proceso').update(
+        status='pendiente', processed_rows=0, started=None, heartbeat=None
+    )
+
+
+def run_job(job, chunk_size=JOB_CHUNK_SIZE):
+    '''
+    Ejecuta una carga masiva en grupos de `chunk_size` filas, actualizando el progreso de la carga después de cada grupo.
+    '''
+    serializer_class = import_string(job.serializer)
+    context = job_context(job)
+    rows = job.payload or []
+    report = []
+    try:
+        for start in range(0, len(rows), chunk_size):
+            serializer = serializer_class(data=rows[start:start + chunk_size], many=True, context=context)
+            serializer.is_valid(raise_exception=False)
+            report.extend(serializer.save())
+            job.processed_rows = min(start + chunk_size, len(rows))
+            job.heartbeat = timezone.now()
+            job.save(update_fields=['processed_rows', 'heartbeat'])
+        job.status = 'completado'
+    except Exception as e:
+        job.status = 'fallido'
+        job.error = str(e)
+    job.report = report
+    job.payload = None
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'error', 'report', 'payload', 'finished'])
+    return job
+
+
+def work(once=False, sleep=2.0):
+    '''
+    Ejecuta las cargas pendientes en orden de creación. Cuando no hay cargas pendientes, recupera las cargas abandonadas
+    (`requeue_stale_jobs`) antes de esperar `sleep` segundos, por lo que la carga de un proceso detenido es retomada por
+    cualquier otro proceso que siga en ejecución. Con `once`, retorna en cuanto no quedan cargas por ejecutar.
+    '''
+    while True:
+        close_old_connections()
+        job = claim_next_job()
+        if job is None and requeue_stale_jobs():
+            job = claim_next_job()
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            time.sleep(sleep)
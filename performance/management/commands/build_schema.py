@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from aapsapi import schema
+
+
+class Command(BaseCommand):
+    help = 'Genera la especificación OpenAPI (swagger, redoc) servida por la API. Debe ejecutarse en cada despliegue.'
+
+    def handle(self, *args, **options):
+        for name in schema.ARTIFACTS:
+            path = schema.write_artifact(name)
+            self.stdout.write(f'{name}: {path}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from performance import jobs
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las cargas masivas (ImportJob) pendientes en segundo plano.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Termina cuando no quedan cargas pendientes.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera entre consultas de cargas pendientes.')
+
+    def handle(self, *args, **options):
+        jobs.work(once=options['once'], sleep=options['sleep'])
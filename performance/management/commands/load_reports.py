@@ -0,0 +1,242 @@
+import codecs
+import csv
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import connection, models, transaction
+from performance.models import VariableReport, IndicatorMeasurement
+from performance.renderers import csv_headers
+from performance.serializers import IndicatorMeasurementSerializer, VariableReportSerializer
+from performance.signals import bulk_change
+
+TARGETS = {
+    'reports': VariableReport,
+    'measurements': IndicatorMeasurement,
+}
+EXPORT_SERIALIZERS = {
+    VariableReport: VariableReportSerializer,
+    IndicatorMeasurement: IndicatorMeasurementSerializer,
+}
+FLOAT_PATTERN = r'^[-+]?([0-9]+(\.[0-9]*)?|\.[0-9]+)([eE][-+]?[0-9]+)?$'
+INTEGER_PATTERN = r'^[-+]?[0-9]+$'
+FLOAT_MAX = sys.float_info.max
+FLOAT_MIN = sys.float_info.min
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class Column:
+    '''
+    Columna del archivo CSV correspondiente a un campo del modelo, con su expresión de validación y de conversión en SQL.
+    '''
+    def __init__(self, field, staging_name, required=False):
+        self.field = field
+        self.staging_name = staging_name
+        self.required = required or (not field.null and not field.has_default())
+        self.value = f"nullif(trim({staging_name}), '')"
+
+    @property
+    def typed_value(self):
+        value = self.value
+        if isinstance(self.field, models.FloatField):
+            value = f'({value})::double precision'
+        elif isinstance(self.field, models.IntegerField):
+            value = f'({value})::integer'
+        if not self.required and not self.field.null and self.field.has_default():
+            return f'coalesce({value}, {literal(self.field.get_default())})'
+        return value
+
+    def range_checks(self):
+        '''
+        Condiciones de los valores numéricos que no caben en el tipo de la columna (`integer` o `double precision`), cuya
+        conversión detendría la carga de todo el archivo.
+        '''
+        number = f'({self.value})::numeric'
+        if isinstance(self.field, models.FloatField):
+            return [f'abs({number}) > {FLOAT_MAX!r}', f'{number} <> 0 AND abs({number}) < {FLOAT_MIN!r}']
+        low, high = connection.ops.integer_field_range(self.field.get_internal_type())
+        return [f'{number} NOT BETWEEN {low} AND {high}'] if low is not None and high is not None else []
+
+    def error(self):
+        '''
+        Expresión que retorna el mensaje de error de la celda o NULL si es válida.
+        '''
+        name = self.field.name
+        checks = []
+        if self.required:
+            checks.append((f'{self.value} IS NULL', f'{name}: campo obligatorio'))
+        checks.append((f'{self.value} IS NULL', None))
+        if isinstance(self.field, (models.FloatField, models.IntegerField)):
+            pattern = FLOAT_PATTERN if isinstance(self.field, models.FloatField) else INTEGER_PATTERN
+            checks.append((f'{self.value} !~ {literal(pattern)}', f'{name}: no es un número válido'))
+            for condition in self.range_checks():
+                checks.append((condition, f'{name}: fuera de rango'))
+            for validator in self.field.validators:
+                if isinstance(validator, MinValueValidator):
+                    checks.append((f'({self.value})::numeric < {validator.limit_value}', f'{name}: menor a {validator.limit_value}'))
+                elif isinstance(validator, MaxValueValidator):
+                    checks.append((f'({self.value})::numeric > {validator.limit_value}', f'{name}: mayor a {validator.limit_value}'))
+        if self.field.choices:
+            options = ', '.join(literal(choice) for choice, label in self.field.flatchoices)
+            checks.append((f'{self.value} NOT IN ({options})', f'{name}: opción no válida'))
+        if getattr(self.field, 'max_length', None):
+            checks.append((f'length({self.value}) > {self.field.max_length}', f'{name}: más de {self.field.max_length} caracteres'))
+        whens = ' '.join(f'WHEN {condition} THEN {literal(message) if message else "NULL"}' for condition, message in checks)
+        return f'CASE {whens} END'
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga archivos CSV de reportes de variables o medidas de indicadores directamente en PostgreSQL. '
+        'Los archivos se copian con COPY a una tabla temporal, se validan en SQL y se combinan con la tabla del modelo '
+        'en una sola sentencia. Las filas rechazadas se escriben en un archivo CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=sorted(TARGETS.keys()), help='Modelo a cargar.')
+        parser.add_argument('files', nargs='+', help=(
+            'Archivos CSV con encabezados (epsa, year, month, v1...v51, v1_type...v51_type o ind1...ind32, '
+            'o los encabezados descriptivos de los archivos exportados con format=csv).'
+        ))
+        parser.add_argument('--rejects', default='rechazados.csv', help='Archivo CSV donde se escriben las filas rechazadas.')
+        parser.add_argument('--delimiter', default=',', help='Separador de columnas de los archivos.')
+        parser.add_argument('--encoding', default='utf-8', help='Codificación de los archivos.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Este comando requiere una base de datos PostgreSQL.')
+        model = TARGETS[options['target']]
+        with open(options['rejects'], 'w', newline='', encoding='utf-8') as rejects:
+            for path in options['files']:
+                counts = self.load_file(model, path, rejects, options)
+                self.stdout.write(
+                    f'{path}: {counts["filas"]} filas, {counts["creado"]} creadas, {counts["actualizado"]} actualizadas, '
+                    f'{counts["sin_cambios"]} sin cambios, {counts["rechazado"]} rechazadas.'
+                )
+
+    def read_columns(self, model, path, options):
+        # Los archivos exportados por la API (`format=csv`) comienzan con un BOM, que no debe formar parte del nombre de la primera
+        # columna, y usan como encabezados los nombres descriptivos de los campos, que se traducen a los nombres de los campos.
+        encoding = 'utf-8-sig' if codecs.lookup(options['encoding']).name == 'utf-8' else options['encoding']
+        with open(path, newline='', encoding=encoding) as f:
+            header = next(csv.reader(f, delimiter=options['delimiter']), None)
+        if not header:
+            raise CommandError(f'{path}: el archivo no tiene encabezados.')
+        fields = {field.name: field for field in model._meta.concrete_fields if not field.primary_key and not getattr(field, 'auto_now', False)}
+        keys = model._meta.unique_together[0]
+        labels = {label.strip(): name for name, label in csv_headers(EXPORT_SERIALIZERS[model]()).items()}
+        columns = []
+        for i, name in enumerate(header):
+            name = labels.get(name.strip(), name.strip())
+            if name in fields:
+                columns.append(Column(fields[name], f'c{i}', required=name in keys and name != 'month'))
+            else:
+                self.stderr.write(f'{path}: la columna "{name}" no corresponde a ningún campo y será ignorada.')
+        names = {column.field.name for column in columns}
+        missing = [key for key in keys if key not in names and key != 'month']
+        if missing:
+            raise CommandError(f'{path}: faltan las columnas {", ".join(missing)}.')
+        return header, columns
+
+    def load_file(self, model, path, rejects, options):
+        header, columns = self.read_columns(model, path, options)
+        table = quote(model._meta.db_table)
+        staging_columns = ', '.join(f'c{i}' for i in range(len(header)))
+        keys = [model._meta.get_field(key) for key in model._meta.unique_together[0]]
+        by_name = {column.field.name: column for column in columns}
+        key_values = [by_name[key.name].typed_value if key.name in by_name else 'NULL::integer' for key in keys]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE staging (_line bigserial, _error text, '
+                + ', '.join(f'c{i} text' for i in range(len(header)))
+                + ') ON COMMIT DROP'
+            )
+            with open(path, 'rb') as f:
+                cursor.copy_expert(
+                    f'COPY staging ({staging_columns}) FROM STDIN WITH (FORMAT csv, HEADER true, '
+                    f'DELIMITER {literal(options["delimiter"])}, ENCODING {literal(options["encoding"])})',
+                    f,
+                )
+            errors = ', '.join(column.error() for column in columns)
+            cursor.execute(f"UPDATE staging SET _error = nullif(array_to_string(ARRAY[{errors}]::text[], '; '), '')")
+
+            writer = csv.writer(rejects)
+            if rejects.tell() == 0:
+                writer.writerow(['archivo', 'fila', 'error'] + header)
+            # `_line` numera las filas de datos; la fila del archivo es una más por la fila de encabezados.
+            cursor.execute(f'SELECT _line + 1, _error, {staging_columns} FROM staging WHERE _error IS NOT NULL ORDER BY _line')
+            rejected = 0
+            for row in cursor:
+                writer.writerow([path] + list(row))
+                rejected += 1
+
+            cursor.execute(self.merge_sql(model, table, columns, keys, key_values))
+            updated, created, valid = cursor.fetchone()
+            if created or updated:
+                bulk_change.send(sender=model)
+            cursor.execute('SELECT count(*) FROM staging')
+            total = cursor.fetchone()[0]
+
+        return {
+            'filas': total,
+            'creado': created,
+            'actualizado': updated,
+            'sin_cambios': valid - created - updated,
+            'rechazado': rejected,
+        }
+
+    def merge_sql(self, model, table, columns, keys, key_values):
+        '''
+        Sentencia única que actualiza las filas existentes que cambiaron e inserta las nuevas.
+        Las llaves se comparan con IS NOT DISTINCT FROM porque `epsa` y `month` pueden ser nulos.
+        Si una llave se repite en el archivo, prevalece la última fila.
+        '''
+        key_names = [quote(key.column) for key in keys]
+        source_columns = [f'{value} AS {name}' for value, name in zip(key_values, key_names)]
+        source_columns += [f'{column.typed_value} AS {quote(column.field.column)}' for column in columns if column.field not in keys]
+        values = [quote(column.field.column) for column in columns if column.field not in keys]
+        match = ' AND '.join(f't.{name} IS NOT DISTINCT FROM src.{name}' for name in key_names)
+
+        modified = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        assignments = [f'{value} = src.{value}' for value in values] + [f'{quote(field.column)} = now()' for field in modified]
+        changed = ' OR '.join(f't.{value} IS DISTINCT FROM src.{value}' for value in values) or 'false'
+
+        given = set(values) | set(key_names)
+        insert_columns = list(key_names) + values
+        insert_values = [f'src.{name}' for name in insert_columns]
+        for field in model._meta.concrete_fields:
+            name = quote(field.column)
+            if field.primary_key or name in given:
+                continue
+            insert_columns.append(name)
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                insert_values.append('now()')
+            elif field.has_default():
+                insert_values.append(literal(field.get_default()))
+            else:
+                insert_values.append('NULL')
+
+        return f'''
+            WITH src AS (
+                SELECT DISTINCT ON ({', '.join(key_names)}) {', '.join(source_columns)}
+                FROM staging WHERE _error IS NULL
+                ORDER BY {', '.join(key_names)}, _line DESC
+            ), upd AS (
+                UPDATE {table} t SET {', '.join(assignments)}
+                FROM src WHERE {match} AND ({changed})
+                RETURNING 1
+            ), ins AS (
+                INSERT INTO {table} ({', '.join(insert_columns)})
+                SELECT {', '.join(insert_values)} FROM src
+                WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM upd), (SELECT count(*) FROM ins), (SELECT count(*) FROM src)
+        '''
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from performance.signals import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina los registros de instancias eliminadas (Tombstone) anteriores a TOMBSTONE_RETENTION_DAYS días. '
+        'Debe ejecutarse periódicamente, por ejemplo una vez al día.'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{prune_tombstones()} eliminaciones borradas.')
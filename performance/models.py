@@ -1,12 +1,16 @@
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from datetime import datetime
+from django.utils import timezone
+from jsonfield import JSONField
+from performance.epsa_cache import epsa_category, epsa_state
 
 class BaseModel(models.Model):
     '''
     Abstract Django Model that adds a `modified` field to all Models, allowing for smart caching at the client side. 
     '''
-    modified = models.DateTimeField(auto_now=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         abstract = True
@@ -243,19 +247,15 @@ class VariableReport(BaseModel):
         m = '-' + str(self.month) if self.month else ''
         return f'{str(self.epsa)}-{str(self.year)}{m}'
     def get_category(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            cat = rel_epsa[0].category
-            if str(cat) in ['A','B','C','D']:
-                return str(cat)
+        cat = str(epsa_category(self.epsa))
+        if cat in ['A','B','C','D']:
+            return cat
         return ''
     get_category.short_description = 'categoría'
     def get_state(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            state_code = str(rel_epsa[0].state)
-            if state_code in state_code_to_name.keys():
-                return state_code_to_name[state_code]
+        state_code = str(epsa_state(self.epsa))
+        if state_code in state_code_to_name.keys():
+            return state_code_to_name[state_code]
         return ''
     get_state.short_description = 'departamento'
 
@@ -385,19 +385,15 @@ class IndicatorMeasurement(BaseModel):
     def __str__(self):
         return f'{self.epsa}-{self.year}'
     def get_category(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            cat = rel_epsa[0].category
-            if str(cat) in ['A','B','C','D']:
-                return str(cat)
+        cat = str(epsa_category(self.epsa))
+        if cat in ['A','B','C','D']:
+            return cat
         return ''
     get_category.short_description = 'categoría'
     def get_state(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            state_code = str(rel_epsa[0].state)
-            if state_code in state_code_to_name.keys():
-                return state_code_to_name[state_code]
+        state_code = str(epsa_state(self.epsa))
+        if state_code in state_code_to_name.keys():
+            return state_code_to_name[state_code]
         return ''
     get_state.short_description = 'departamento'
 
@@ -416,3 +412,117 @@ for i, ind_name, ind_unit in zip(range(32), INDICATOR_NAMES, INDICATOR_UNITS):
     )
 
 
+class ImportJob(models.Model):
+    '''
+    Modelo representando una carga masiva ejecutada en segundo plano por el comando `importworker`.
+    '''
+    STATUS_CHOICES = (
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    )
+    serializer = models.CharField(
+        max_length=255,
+        verbose_name='serializador',
+        help_text='Ruta del serializador que ejecuta la carga.'
+    )
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True, null=True,
+        verbose_name='usuario',
+        help_text='Usuario que realizó la carga.'
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default='pendiente',
+        db_index=True,
+        verbose_name='estado',
+        help_text='Estado de la carga.'
+    )
+    payload = JSONField(
+        blank=True, null=True,
+        verbose_name='datos',
+        help_text='Lista de objetos a ingresar. Se elimina al terminar la carga.'
+    )
+    total_rows = models.PositiveIntegerField(
+        default=0,
+        verbose_name='filas',
+        help_text='Número de filas de la carga.'
+    )
+    processed_rows = models.PositiveIntegerField(
+        default=0,
+        verbose_name='filas procesadas',
+        help_text='Número de filas procesadas hasta el momento.'
+    )
+    report = JSONField(
+        blank=True, null=True,
+        verbose_name='reporte',
+        help_text='Resultado (creado, actualizado, ignorado) de cada fila.'
+    )
+    error = models.TextField(
+        blank=True, null=True,
+        verbose_name='error',
+        help_text='Error que detuvo la carga.'
+    )
+    context = JSONField(
+        blank=True, null=True,
+        verbose_name='contexto',
+        help_text='Opciones del pedido original (por ejemplo, `dry_run`) pasadas al serializador.'
+    )
+    created = models.DateTimeField(auto_now_add=True, verbose_name='creado')
+    started = models.DateTimeField(blank=True, null=True, verbose_name='iniciado')
+    heartbeat = models.DateTimeField(
+        blank=True, null=True,
+        verbose_name='última actividad',
+        help_text='Momento en que el proceso que ejecuta la carga confirmó el último grupo de filas.'
+    )
+    finished = models.DateTimeField(blank=True, null=True, verbose_name='terminado')
+
+    class Meta:
+        verbose_name = 'Carga masiva'
+        verbose_name_plural = 'Cargas masivas'
+        ordering = ['-created',]
+
+    def __str__(self):
+        return f'{self.id} ({self.status})'
+
+    def rows_per_second(self):
+        if not self.started or not self.processed_rows:
+            return None
+        end = self.finished or timezone.now()
+        elapsed = (end - self.started).total_seconds()
+        return round(self.processed_rows / elapsed, 2) if elapsed > 0 else None
+
+
+class Tombstone(models.Model):
+    '''
+    Modelo representando la eliminación de una instancia, para que los clientes que sincronizan con `modified_since` también reciban las eliminaciones.
+    '''
+    model = models.CharField(
+        max_length=100,
+        verbose_name='modelo',
+        help_text='Modelo de la instancia eliminada, en formato `app.modelo`.'
+    )
+    object_id = models.CharField(
+        max_length=64,
+        verbose_name='id',
+        help_text='Llave primaria de la instancia eliminada.'
+    )
+    key = JSONField(
+        blank=True, null=True,
+        verbose_name='llave',
+        help_text='Campos que identifican a la instancia eliminada de manera única (por ejemplo, `epsa`, `year` y `month`).'
+    )
+    deleted = models.DateTimeField(auto_now_add=True, verbose_name='eliminado')
+
+    class Meta:
+        verbose_name = 'Eliminación'
+        verbose_name_plural = 'Eliminaciones'
+        ordering = ['deleted',]
+        index_together = [('model', 'deleted'),]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
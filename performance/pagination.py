@@ -0,0 +1,123 @@
+import binascii
+import json
+from base64 import b64decode, b64encode
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+NOTHING = Q(pk__in=[])
+
+
+class KeysetPagination(CursorPagination):
+    '''
+    Paginación por llaves sobre el orden `Meta.ordering` del modelo, desempatado por la llave primaria.
+
+    El cursor contiene los valores de la última (o primera) instancia de la página, por lo que cada página se obtiene
+    filtrando a partir de esa posición en lugar de contar filas: el tiempo de respuesta no depende de la profundidad
+    de la página. Los valores nulos se ordenan al final en cualquier base de datos.
+    '''
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 5000
+
+    def get_ordering(self, request, queryset, view):
+        model = queryset.model
+        ordering = [name for name in model._meta.ordering if name.lstrip('-') not in ('pk', model._meta.pk.name)]
+        return tuple(ordering) + (model._meta.pk.name,)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.set_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = self.cursor if self.cursor else (False, None)
+
+        queryset = queryset.order_by(*self.order_expressions(reverse))
+        if position is not None:
+            queryset = queryset.filter(self.after(position, reverse))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_previous = has_more
+            self.has_next = bool(self.page)
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None and bool(self.page)
+        return self.page
+
+    def set_ordering(self, request, queryset, view=None):
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.attnames = [queryset.model._meta.get_field(name.lstrip('-')).attname for name in self.ordering]
+
+    def sort_queryset(self, queryset, request, view=None):
+        '''
+        Queryset completo en el mismo orden que las páginas, para recorrer todas las instancias sin paginar (por ejemplo, con `stream=1`).
+        '''
+        self.set_ordering(request, queryset, view)
+        return queryset.order_by(*self.order_expressions(False))
+
+    def order_expressions(self, reverse):
+        expressions = []
+        for name, attname in zip(self.ordering, self.attnames):
+            if name.startswith('-') != reverse:
+                expressions.append(F(attname).desc(nulls_first=True))
+            else:
+                expressions.append(F(attname).asc(nulls_last=True))
+        return expressions
+
+    def after(self, position, reverse):
+        '''
+        Filtro de las instancias posteriores a `position` en el orden lexicográfico de la página.
+        '''
+        after = NOTHING
+        equal = Q()
+        for name, attname, value in zip(self.ordering, self.attnames, position):
+            descending = name.startswith('-') != reverse
+            if value is None:
+                greater = Q(**{f'{attname}__isnull': False}) if descending else NOTHING
+                same = Q(**{f'{attname}__isnull': True})
+            elif descending:
+                greater = Q(**{f'{attname}__lt': value})
+                same = Q(**{attname: value})
+            else:
+                greater = Q(**{f'{attname}__gt': value}) | Q(**{f'{attname}__isnull': True})
+                same = Q(**{attname: value})
+            after |= equal & greater
+            equal &= same
+        return after
+
+    def position(self, instance):
+        return [getattr(instance, attname) for attname in self.attnames]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor((False, self.position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor((True, self.position(self.page[0])))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            reverse, position = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_').decode('utf-8'))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), position
+
+    def encode_cursor(self, cursor):
+        encoded = b64encode(json.dumps(cursor, default=str).encode('utf-8'), altchars=b'-_').decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
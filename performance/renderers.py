@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from collections import OrderedDict
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from performance.streaming import CHUNK_SIZE
+
+BOM = '\ufeff'
+
+
+def csv_headers(serializer):
+    '''
+    Encabezados de las columnas CSV de un serializador (`{campo: encabezado}`), tomados de los nombres descriptivos de los campos
+    del modelo. Si dos campos tienen el mismo nombre descriptivo (por ejemplo, los `v{i}_type`), se añade el nombre del campo entre paréntesis.
+    '''
+    labels = OrderedDict((field.field_name, str(field.label or field.field_name)) for field in serializer._readable_fields)
+    counts = {}
+    for label in labels.values():
+        counts[label] = counts.get(label, 0) + 1
+    return OrderedDict(
+        (name, label if counts[label] == 1 else f'{label} ({name})')
+        for name, label in labels.items()
+    )
+
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+    return value
+
+
+def iter_csv(items, headers, chunk_size=CHUNK_SIZE):
+    '''
+    Escribe los objetos de `items` como filas CSV con las columnas `headers`, retornando el texto por partes de al menos `chunk_size` caracteres.
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write(BOM)
+    writer.writerow(headers.values())
+    names = list(headers.keys())
+    for item in items:
+        writer.writerow([csv_value(item.get(name)) for name in names])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class CSVRenderer(BaseRenderer):
+    '''
+    Renderiza las respuestas en formato CSV. Las listas de los puntos de acceso con `StreamingListMixin` no pasan por este
+    renderizador: son escritas fila por fila directamente desde la base de datos.
+    '''
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict) and 'results' in data:
+            data = data['results']
+        if isinstance(data, dict):
+            data = [data]
+        headers = OrderedDict()
+        for item in data:
+            for name in item.keys():
+                headers.setdefault(name, name)
+        return ''.join(iter_csv(data, headers)).encode(self.charset)
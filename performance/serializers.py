@@ -2,7 +2,9 @@ from rest_framework import serializers
 from collections import OrderedDict
 from rest_framework.relations import PKOnlyObject
 from drf_queryfields import QueryFieldsMixin
-from performance.models import EPSA, Variable, Indicator, VariableReport, IndicatorMeasurement
+from performance.models import EPSA, Variable, Indicator, VariableReport, IndicatorMeasurement, ImportJob
+from performance.upsert import BulkUpsert, DEFAULT_BATCH_SIZE
+from performance.validation import BatchValidator
 
 class CustomModelSerializer(QueryFieldsMixin,serializers.ModelSerializer):
     def to_representation(self,instance):
@@ -23,39 +25,39 @@ class CustomModelSerializer(QueryFieldsMixin,serializers.ModelSerializer):
         return ret
 
 class CustomListModelSerializer(serializers.ListSerializer):
+    '''
+    Serializador de listas que valida el lote completo por columnas en lugar de validar cada objeto con el serializador hijo.
+    `is_valid` retorna `False` si algún objeto es inválido (`errors` es la lista de errores por objeto), pero los objetos
+    inválidos no detienen la carga: `save` guarda los objetos válidos y `create` reporta los inválidos como `ignorado` junto a sus errores.
+    Si el contexto contiene `dry_run`, `create` sólo calcula el resultado de cada objeto sin escribir nada, y `batch_size` limita
+    el número de instancias escritas por consulta.
+    '''
+    nested = {}
+
     def is_valid(self,raise_exception=False):
         if not hasattr(self, '_validated_data'):
+            self.row_errors = BatchValidator(self.child.Meta.model, self.nested).validate(self.initial_data)
             self._validated_data = self.initial_data
-            self._errors = {}
-        return True
-
-def bulk_create_or_update(model,data,unique_together=[]):
-    ret = []
-    for props in data:
-        if not set(unique_together) <= set(props.keys()):
-            ret.append({'ignorado':{'no_identificable':'No se proporcionaron todos los campos necesarios para identificar la instancia de manera única.'}})
-            continue
-        key_vals = [props.get(key_prop) for key_prop in unique_together]
-        if not any(key_vals):
-            ret.append({'ignorado':{'objeto_en_blanco':'Todas las propiedades clave de este objeto estan en blanco.'}})
-            continue
-        qs = model.objects.filter(**{k:v for k,v in zip(unique_together,key_vals)})
-        if qs.count() > 0:
-            qs.update(**props)
-            ret_key = 'actualizado'
-        else:
-            e,created = model.objects.get_or_create(**props)
-            if created:
-                ret_key = 'creado'
-            else:
-                ret_key = 'ignorado'
-        ret.append({ret_key: props})
-    return ret
+            self._errors = [errors or {} for errors in self.row_errors] if any(self.row_errors) else []
+        if self._errors and raise_exception:
+            raise serializers.ValidationError(self.errors)
+        return not self._errors
+
+    def save(self, **kwargs):
+        self.instance = self.create(self.validated_data)
+        return self.instance
+
+    @property
+    def batch_size(self):
+        return self.context.get('batch_size', DEFAULT_BATCH_SIZE)
+
+def bulk_create_or_update(model,data,unique_together=[],errors=None,dry_run=False,batch_size=DEFAULT_BATCH_SIZE):
+    return BulkUpsert(model,data,unique_together,batch_size=batch_size,errors=errors).run(dry_run=dry_run)
 
 class EPSAListSerializer(CustomListModelSerializer):
     def create(self, validated_data):
         unique_together = ['code',]
-        return bulk_create_or_update(EPSA,validated_data,unique_together)
+        return bulk_create_or_update(EPSA,validated_data,unique_together,self.row_errors,self.context.get('dry_run',False),self.batch_size)
 class EPSASerializer(CustomModelSerializer):
     class Meta:
         model = EPSA
@@ -65,7 +67,7 @@ class EPSASerializer(CustomModelSerializer):
 class VariableListSerializer(CustomListModelSerializer):
     def create(self, validated_data):
         unique_together = ['code',]
-        return bulk_create_or_update(Variable,validated_data,unique_together)
+        return bulk_create_or_update(Variable,validated_data,unique_together,self.row_errors,self.context.get('dry_run',False),self.batch_size)
 class VariableSerializer(CustomModelSerializer):
     class Meta:
         model = Variable
@@ -75,7 +77,7 @@ class VariableSerializer(CustomModelSerializer):
 class IndicatorListSerializer(CustomListModelSerializer):
     def create(self, validated_data):
         unique_together = ['code',]
-        return bulk_create_or_update(Indicator,validated_data,unique_together)
+        return bulk_create_or_update(Indicator,validated_data,unique_together,self.row_errors,self.context.get('dry_run',False),self.batch_size)
 class IndicatorSerializer(QueryFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Indicator
@@ -85,7 +87,7 @@ class IndicatorSerializer(QueryFieldsMixin, serializers.ModelSerializer):
 class VariableReportListSerializer(CustomListModelSerializer):
     def create(self, validated_data):
         unique_together = ['epsa','year','month',]
-        return bulk_create_or_update(VariableReport,validated_data,unique_together)
+        return bulk_create_or_update(VariableReport,validated_data,unique_together,self.row_errors,self.context.get('dry_run',False),self.batch_size)
 class VariableReportSerializer(QueryFieldsMixin, serializers.ModelSerializer):
     # epsa = serializers.CharField(allow_blank=True,required=False)
     class Meta:
@@ -106,7 +108,7 @@ class VariableReportSerializer(QueryFieldsMixin, serializers.ModelSerializer):
 class IndicatorMeasurementListSerializer(CustomListModelSerializer):
     def create(self, validated_data):
         unique_together = ['epsa','year','month',]
-        return bulk_create_or_update(IndicatorMeasurement,validated_data,unique_together)
+        return bulk_create_or_update(IndicatorMeasurement,validated_data,unique_together,self.row_errors,self.context.get('dry_run',False),self.batch_size)
 class IndicatorMeasurementSerializer(QueryFieldsMixin, serializers.ModelSerializer):
     # epsa = serializers.CharField(allow_blank=True,required=False)
     class Meta:
@@ -124,5 +126,10 @@ class IndicatorMeasurementSerializer(QueryFieldsMixin, serializers.ModelSerializ
     #         measurement = IndicatorMeasurement.objects.create(**validated_data)
 
     #     return measurement
-    
 
+class ImportJobSerializer(QueryFieldsMixin, serializers.ModelSerializer):
+    rows_per_second = serializers.FloatField(read_only=True)
+    report = serializers.JSONField(read_only=True)
+    class Meta:
+        model = ImportJob
+        exclude = ('payload', 'context',)
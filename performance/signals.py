@@ -0,0 +1,113 @@
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from datetime import timedelta
+from django.utils import timezone
+from django.dispatch import Signal
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+# Enviada (con el modelo como `sender`) por las escrituras en masa (`bulk_create`, `bulk_update`, SQL directo), que no envían
+# `post_save` ni `post_delete`.
+bulk_change = Signal()
+
+TOMBSTONE_MODELS = (
+    'performance.EPSA',
+    'performance.Variable',
+    'performance.Indicator',
+    'performance.VariableReport',
+    'performance.IndicatorMeasurement',
+    'planning.POA',
+    'planning.Plan',
+)
+DEFAULT_TOMBSTONE_RETENTION_DAYS = 90
+VERSIONED_APPS = ('performance', 'planning', 'ambiental', 'supply_areas')
+UNVERSIONED_MODELS = ('performance.importjob', 'performance.tombstone')
+
+
+def natural_key(instance):
+    '''
+    Campos que identifican a la instancia de manera única: los de `unique_together` o, si no tiene, la llave primaria.
+    '''
+    opts = instance._meta
+    names = opts.unique_together[0] if opts.unique_together else (opts.pk.name,)
+    return {name: getattr(instance, name) for name in names}
+
+
+def record_deletion(sender, instance, **kwargs):
+    from performance.models import Tombstone
+    Tombstone.objects.create(model=sender._meta.label_lower, object_id=str(instance.pk), key=natural_key(instance))
+
+
+def tombstone_cutoff():
+    '''
+    Fecha desde la que se conservan las eliminaciones: `TOMBSTONE_RETENTION_DAYS` días atrás (90 por defecto), o `None` si el valor
+    es `None` y las eliminaciones se conservan indefinidamente.
+    '''
+    days = getattr(settings, 'TOMBSTONE_RETENTION_DAYS', DEFAULT_TOMBSTONE_RETENTION_DAYS)
+    return None if days is None else timezone.now() - timedelta(days=days)
+
+
+def prune_tombstones():
+    '''
+    Elimina las eliminaciones registradas antes de `tombstone_cutoff()`. Retorna el número de registros eliminados.
+    '''
+    from performance.models import Tombstone
+    cutoff = tombstone_cutoff()
+    if cutoff is None:
+        return 0
+    return Tombstone.objects.filter(deleted__lt=cutoff).delete()[0]
+
+
+def connect_tombstones():
+    for label in TOMBSTONE_MODELS:
+        post_delete.connect(record_deletion, sender=label, dispatch_uid=f'tombstone_{label}')
+
+
+def bump_table_version(sender, **kwargs):
+    from performance.cache import bump_version
+    bump_version(sender)
+
+
+def connect_versions():
+    '''
+    Conecta los cambios de los modelos de `VERSIONED_APPS` con las versiones de sus tablas usadas por el caché de respuestas.
+    '''
+    for label in VERSIONED_APPS:
+        for model in apps.get_app_config(label).get_models():
+            if model._meta.label_lower in UNVERSIONED_MODELS:
+                continue
+            post_save.connect(bump_table_version, sender=model, dispatch_uid=f'version_save_{model._meta.label_lower}')
+            post_delete.connect(bump_table_version, sender=model, dispatch_uid=f'version_delete_{model._meta.label_lower}')
+    bulk_change.connect(bump_table_version, dispatch_uid='version_bulk_change')
+
+
+def bump_user_version(sender, **kwargs):
+    from performance.cache import bump_version
+    bump_version(get_user_model())
+
+
+def store_credentials_version(sender, instance, **kwargs):
+    from performance.authentication import store_credentials_version
+    store_credentials_version(instance)
+
+
+def forget_credentials_version(sender, instance, **kwargs):
+    from performance.authentication import forget_credentials_version
+    forget_credentials_version(instance.pk)
+
+
+def connect_auth_versions():
+    '''
+    Conecta los cambios de tokens, usuarios, grupos y permisos con las versiones de las tablas de tokens y usuarios usadas por
+    el caché de autenticación, y los cambios de usuarios con la versión de sus credenciales.
+    '''
+    for label in ('authtoken.Token', settings.AUTH_USER_MODEL):
+        post_save.connect(bump_table_version, sender=label, dispatch_uid=f'version_save_{label}')
+        post_delete.connect(bump_table_version, sender=label, dispatch_uid=f'version_delete_{label}')
+    user_model = get_user_model()
+    for through in (user_model.groups.through, user_model.user_permissions.through, Group.permissions.through):
+        m2m_changed.connect(bump_user_version, sender=through, dispatch_uid=f'version_m2m_{through._meta.label_lower}')
+    post_delete.connect(bump_user_version, sender=Group, dispatch_uid='version_delete_group')
+    post_save.connect(store_credentials_version, sender=settings.AUTH_USER_MODEL, dispatch_uid='credentials_save')
+    post_delete.connect(forget_credentials_version, sender=settings.AUTH_USER_MODEL, dispatch_uid='credentials_delete')
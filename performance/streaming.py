@@ -0,0 +1,176 @@
+import codecs
+import csv
+import json
+import re
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'\s*')
+decoder = json.JSONDecoder()
+
+
+def iter_text(stream, chunk_size=CHUNK_SIZE):
+    '''
+    Lee el cuerpo de un pedido por partes, decodificándolo como UTF-8 (con o sin BOM) sin cargarlo completo en memoria.
+    '''
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        text = text_decoder.decode(chunk)
+        if text:
+            yield text
+    tail = text_decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_lines(stream, chunk_size=CHUNK_SIZE):
+    '''
+    Retorna las líneas del cuerpo de un pedido una a una, conservando el salto de línea.
+    '''
+    pending = ''
+    for text in iter_text(stream, chunk_size):
+        pending += text
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def iter_ndjson_rows(stream):
+    '''
+    Retorna pares (número de línea, objeto) de un cuerpo en formato NDJSON (un objeto JSON por línea).
+    '''
+    for line_number, line in enumerate(iter_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f'Línea {line_number}: {e}')
+        yield line_number, row
+
+
+def iter_csv_rows(stream):
+    '''
+    Retorna pares (número de línea, objeto) de un cuerpo en formato CSV con encabezados. Las celdas vacías se convierten en `null`.
+    '''
+    reader = csv.DictReader(iter_lines(stream))
+    try:
+        for row in reader:
+            yield reader.line_num, {k.strip(): (v if v != '' else None) for k, v in row.items() if k}
+    except csv.Error as e:
+        raise ValueError(f'Línea {reader.line_num}: {e}')
+
+
+def iter_json_array(items, chunk_size=CHUNK_SIZE):
+    '''
+    Codifica los objetos de `items` como un arreglo JSON, retornando el texto por partes de al menos `chunk_size` caracteres.
+    '''
+    encoder = JSONEncoder(
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+    )
+    parts = ['[']
+    size = 1
+    separator = ''
+    for item in items:
+        text = separator + encoder.encode(item)
+        separator = ','
+        parts.append(text)
+        size += len(text)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    parts.append(']')
+    yield ''.join(parts)
+
+
+class FeatureCollectionReader:
+    '''
+    Lee un objeto GeoJSON del tipo "FeatureCollection" de manera incremental.
+
+    Iterar sobre el lector retorna los "features" uno a uno, por lo que la memoria utilizada depende
+    del tamaño del "feature" más grande y no del tamaño total del documento.
+    '''
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.chunks = iter_text(stream, chunk_size)
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self):
+        # Se lee al menos tanto como lo pendiente en el buffer, para que decodificar un valor grande sea lineal.
+        pending = self.buffer[self.pos:]
+        wanted = max(len(pending), self.chunk_size)
+        parts = [pending]
+        read = 0
+        while read < wanted:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.eof = True
+                break
+            parts.append(chunk)
+            read += len(chunk)
+        self.buffer = ''.join(parts)
+        self.pos = 0
+        return read > 0
+
+    def _peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return ''
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f'Se esperaba uno de los caracteres {chars!r} en la posición {self.pos} del bloque leído.')
+        self.pos += 1
+        return char
+
+    def _decode_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_more()
+
+    def _iter_array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            if self._expect(',]') == ']':
+                return
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._decode_value()
+            self._expect(':')
+            if key == 'features':
+                yield from self._iter_array()
+            else:
+                self._decode_value()
+            if self._expect(',}') == '}':
+                return
@@ -1,3 +1,700 @@
-from django.test import TestCase
+import csv
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import weakref
+from datetime import timedelta
+from unittest import mock, skipIf
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from performance import columnar, epsa_cache, jobs, representation, unpivot
+from performance.authentication import CachedBasicAuthentication, CachedTokenAuthentication
+from performance.cache import response_cache, versions_cache
+from performance.management.commands.load_reports import Column, Command as LoadReportsCommand
+from performance.models import EPSA, ImportJob, Tombstone, Variable, VariableReport
+from performance.representation import ColumnPlan
+from performance.serializers import EPSASerializer, VariableReportSerializer, VariableSerializer
+from performance.validation import REQUIRED_FIELD
+from performance.views import VariableReportViewSet
 
-# Create your tests here.
+
+def cache_settings(versions_dir=None):
+    versions = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'versions', 'TIMEOUT': None}
+    if versions_dir is not None:
+        versions = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': versions_dir, 'TIMEOUT': None}
+    return {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'responses': {'BACKEND': 'performance.cache.ByteLRUCache', 'TIMEOUT': None},
+        'versions': versions,
+    }
+
+
+class APITestCase(TransactionTestCase):
+    def setUp(self):
+        response_cache().clear()
+        versions_cache().clear()
+        epsa_cache._epsas = (None, {})
+        self.user = User.objects.create_superuser('admin', 'admin@aaps.gob.bo', 'clave')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class SharedVersionsTest(APITestCase):
+    '''
+    Las escrituras de otro proceso (por ejemplo, `django_worker` o `load_reports`) invalidan las respuestas guardadas.
+    '''
+    def setUp(self):
+        self.versions_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(CACHES=cache_settings(self.versions_dir.name))
+        self.settings_override.enable()
+        super(SharedVersionsTest, self).setUp()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.versions_dir.cleanup()
+
+    def bump_in_other_process(self):
+        env = dict(os.environ, DJANGO_CACHE_VERSIONS_DIR=self.versions_dir.name, PYTHONPATH=os.pathsep.join(sys.path))
+        code = (
+            'import django; django.setup()\n'
+            'from performance.models import VariableReport\n'
+            'from performance.signals import bulk_change\n'
+            'bulk_change.send(sender=VariableReport)\n'
+        )
+        subprocess.run([sys.executable, '-c', code], env=env, check=True)
+
+    def test_write_in_other_process_invalidates_cache(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, v1=1)
+        first = self.client.get('/api/reports/')
+        self.assertEqual(first.status_code, 200)
+        VariableReport.objects.update(v1=2)
+        self.assertEqual(self.client.get('/api/reports/').content, first.content)
+        self.bump_in_other_process()
+        response = self.client.get('/api/reports/')
+        self.assertEqual(response.json()['results'][0]['v1'], 2.0)
+
+
+class SchemaTest(APITestCase):
+    def test_openapi_etag(self):
+        response = self.client.get('/openapi.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('paths', response.json())
+        response = self.client.get('/openapi.json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_docs(self):
+        self.assertEqual(self.client.get('/docs/').status_code, 200)
+
+
+class BulkUpsertReportTest(APITestCase):
+    def test_report(self):
+        Variable.objects.create(code='V1', var_id=1)
+        rows = [
+            {'code': 'V1', 'name': 'Volumen'},
+            {'code': 'V2', 'var_id': 2},
+            {'code': 'V3'},
+            {'code': 'V4', 'var_id': 4, 'var_type': 'otro'},
+            {'code': 'V1', 'name': 'Volumen'},
+            {'name': 'Sin código'},
+            'V5',
+        ]
+        response = self.client.post('/api/variables/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([list(row) for row in response.data], [
+            ['actualizado'], ['creado'], ['ignorado'], ['ignorado'], ['sin_cambios'], ['ignorado'], ['ignorado'],
+        ])
+        self.assertEqual(response.data[2]['ignorado'], {'invalido': {'var_id': [REQUIRED_FIELD]}})
+        self.assertIn('var_type', response.data[3]['ignorado']['invalido'])
+        self.assertIn('no_identificable', response.data[5]['ignorado'])
+        self.assertIn('objeto_invalido', response.data[6]['ignorado'])
+        self.assertEqual(sorted(Variable.objects.values_list('code', flat=True)), ['V1', 'V2'])
+        self.assertEqual(Variable.objects.get(code='V1').name, 'Volumen')
+
+    def test_invalid_values(self):
+        rows = [
+            {'epsa': 'EPSA1', 'year': 'abc', 'month': 1},
+            {'epsa': 'EPSA1', 'year': 2018, 'month': 13},
+            {'epsa': 'EPSA1', 'year': 2018, 'month': 1, 'v1': 'abc'},
+            {'epsa': 'EPSA1', 'year': 2018, 'month': 2, 'v1': '1.5'},
+        ]
+        response = self.client.post('/api/reports/', rows, format='json')
+        self.assertIn('valor_invalido', response.data[0]['ignorado'])
+        self.assertIn('month', response.data[1]['ignorado']['invalido'])
+        self.assertIn('v1', response.data[2]['ignorado']['invalido'])
+        self.assertIn('creado', response.data[3])
+        self.assertEqual(VariableReport.objects.get().v1, 1.5)
+
+    def test_batch_size(self):
+        rows = [{'epsa': 'EPSA1', 'year': 2018, 'month': month, 'v1': month} for month in range(1, 13)]
+        with mock.patch.object(VariableReportViewSet, 'upsert_batch_size', 3):
+            for value in (1, 2):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.post('/api/reports/', [dict(row, v2=value) for row in rows], format='json')
+                writes = [query['sql'].split()[0] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))]
+                self.assertEqual(writes, ['INSERT' if value == 1 else 'UPDATE'] * 4)
+        self.assertEqual(set(VariableReport.objects.values_list('v2', flat=True)), {2})
+
+    def test_is_valid(self):
+        serializer = VariableSerializer(data=[{'code': 'V1', 'var_id': 1}, {'code': 'V2', 'var_id': -1}], many=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(list(serializer.errors[1]), ['var_id'])
+        self.assertIn('creado', serializer.save()[0])
+        self.assertTrue(VariableSerializer(data=[{'code': 'V1', 'var_id': 1}], many=True).is_valid())
+
+
+class LoadReportsTest(SimpleTestCase):
+    def test_header_with_bom(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8-sig', delete=False) as f:
+            f.write('epsa,year,month,v1\r\nEPSA1,2018,1,1.5\r\n')
+        self.addCleanup(os.remove, f.name)
+        header, columns = LoadReportsCommand().read_columns(VariableReport, f.name, {'encoding': 'utf-8', 'delimiter': ','})
+        self.assertEqual([column.field.name for column in columns], ['epsa', 'year', 'month', 'v1'])
+
+    def test_range_checks(self):
+        error = Column(VariableReport._meta.get_field('v1'), 'c1').error()
+        self.assertLess(error.index('no es un número válido'), error.index('v1: fuera de rango'))
+
+
+@skipIf(connection.vendor != 'postgresql', 'requiere PostgreSQL')
+class LoadReportsPostgresTest(APITestCase):
+    def write_csv(self, text, encoding='utf-8'):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding=encoding, newline='', delete=False) as f:
+            f.write(text)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def load(self, path):
+        rejects = self.write_csv('')
+        out = io.StringIO()
+        call_command('load_reports', 'reports', path, rejects=rejects, stdout=out, stderr=io.StringIO())
+        with open(rejects, newline='', encoding='utf-8') as f:
+            return out.getvalue(), list(csv.reader(f))
+
+    def test_load(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1)
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=2, v1=1)
+        path = self.write_csv(
+            'epsa,year,month,v1\r\n'
+            'EPSA1,2018,1,1\r\n'
+            'EPSA1,2018,2,5\r\n'
+            'EPSA1,2018,3,2.5\r\n'
+            'EPSA1,2018,4,abc\r\n'
+            'EPSA1,2018,5,1e400\r\n'
+            ',2018,6,1\r\n'
+        )
+        output, rejects = self.load(path)
+        self.assertEqual(output.strip(), f'{path}: 6 filas, 1 creadas, 1 actualizadas, 1 sin cambios, 3 rechazadas.')
+        self.assertEqual(rejects, [
+            ['archivo', 'fila', 'error', 'epsa', 'year', 'month', 'v1'],
+            [path, '5', 'v1: no es un número válido', 'EPSA1', '2018', '4', 'abc'],
+            [path, '6', 'v1: fuera de rango', 'EPSA1', '2018', '5', '1e400'],
+            [path, '7', 'epsa: campo obligatorio', '', '2018', '6', '1'],
+        ])
+        self.assertEqual(list(VariableReport.objects.order_by('month').values_list('month', 'v1')), [(1, 1.0), (2, 5.0), (3, 2.5)])
+
+    def test_load_api_export(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1.5, v1_type='NR')
+        VariableReport.objects.create(epsa='EPSA2', year=2018, month=None, v2=3)
+        export = self.client.get('/api/reports/?format=csv')
+        path = self.write_csv(b''.join(export.streaming_content).decode('utf-8'))
+        VariableReport.objects.all().delete()
+        output, rejects = self.load(path)
+        self.assertIn('2 filas, 2 creadas', output)
+        self.assertEqual(len(rejects), 1)
+        self.assertEqual(
+            sorted(VariableReport.objects.values_list('epsa', 'month', 'v1', 'v1_type', 'v2')),
+            [('EPSA1', 1, 1.5, 'NR', None), ('EPSA2', None, None, 'VA', 3.0)],
+        )
+
+
+@skipIf(columnar.pyarrow is None, 'requiere pyarrow')
+class ColumnarExportTest(APITestCase):
+    def test_unknown_fields(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, v1=1)
+        response = self.client.get('/api/reports/arrow/?fields=v1,otro')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['fields'], ['Campo desconocido: otro.'])
+        response = self.client.get('/api/reports/arrow/?fields=epsa,v1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content))
+
+
+class ImportJobTest(APITestCase):
+    rows = [{'epsa': 'EPSA1', 'year': 2018, 'month': month, 'v1': month} for month in range(1, 13)]
+
+    def test_async_import(self):
+        response = self.client.post('/api/reports/?async=1', self.rows, format='json')
+        self.assertEqual(response.status_code, 202)
+        jobs.work(once=True)
+        job = ImportJob.objects.get(pk=response.data['job'])
+        self.assertEqual((job.status, job.processed_rows, job.payload), ('completado', 12, None))
+        self.assertEqual(job.user, self.user)
+        self.assertEqual(len(job.report), 12)
+        self.assertEqual(VariableReport.objects.count(), 12)
+
+    def test_context(self):
+        job = ImportJob.objects.create(
+            serializer='performance.serializers.VariableReportSerializer', payload=self.rows, total_rows=12, context={'dry_run': True},
+        )
+        jobs.run_job(jobs.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completado')
+        self.assertIn('creado', job.report[0])
+        self.assertFalse(VariableReport.objects.exists())
+
+    def test_requeue_stale_jobs(self):
+        stale = timezone.now() - timedelta(hours=1)
+        job = ImportJob.objects.create(
+            serializer='performance.serializers.VariableReportSerializer', payload=self.rows, total_rows=12,
+            status='en_proceso', started=stale, heartbeat=stale, processed_rows=5,
+        )
+        running = ImportJob.objects.create(
+            serializer='performance.serializers.VariableReportSerializer', payload=self.rows, total_rows=12,
+            status='en_proceso', started=stale, heartbeat=timezone.now(),
+        )
+        jobs.work(once=True)
+        job.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual((job.status, job.processed_rows), ('completado', 12))
+        self.assertEqual(running.status, 'en_proceso')
+
+    def test_requeue_while_polling(self):
+        job = ImportJob.objects.create(
+            serializer='performance.serializers.VariableReportSerializer', payload=self.rows, total_rows=12,
+            status='en_proceso', started=timezone.now(), heartbeat=timezone.now(),
+        )
+
+        class Stop(Exception):
+            pass
+
+        def sleep(seconds):
+            if ImportJob.objects.filter(status='completado').exists():
+                raise Stop
+            ImportJob.objects.update(heartbeat=timezone.now() - timedelta(hours=1))
+
+        with mock.patch('performance.jobs.time.sleep', side_effect=sleep), self.assertRaises(Stop):
+            jobs.work()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_rows), ('completado', 12))
+
+
+class TokenCacheTest(APITestCase):
+    def setUp(self):
+        super(TokenCacheTest, self).setUp()
+        CachedTokenAuthentication.cache.clear()
+        self.auth = CachedTokenAuthentication()
+        self.reader = User.objects.create_user('lector', 'lector@aaps.gob.bo', 'clave')
+        self.reader.user_permissions.add(Permission.objects.get(codename='add_epsa'))
+        self.token = Token.objects.create(user=self.reader)
+
+    def test_cached_copies(self):
+        first, token = self.auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            second, token = self.auth.authenticate_credentials(self.token.key)
+            self.assertTrue(second.has_perm('performance.add_epsa'))
+        self.assertIsNot(first, second)
+        self.assertIs(token.user, second)
+
+    def test_invalidation(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.reader.user_permissions.clear()
+        user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertFalse(user.has_perm('performance.add_epsa'))
+        self.reader.is_active = False
+        self.reader.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deleted_token(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+
+class BasicCacheTest(APITestCase):
+    def setUp(self):
+        super(BasicCacheTest, self).setUp()
+        CachedBasicAuthentication.cache.clear()
+        self.auth = CachedBasicAuthentication()
+        self.reader = User.objects.create_user('lector', 'lector@aaps.gob.bo', 'clave')
+
+    def test_cached_copies(self):
+        first, auth = self.auth.authenticate_credentials('lector', 'clave')
+        with self.assertNumQueries(0):
+            second, auth = self.auth.authenticate_credentials('lector', 'clave')
+        self.assertEqual(second, self.reader)
+        self.assertIsNot(first, second)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials('lector', 'otra')
+
+    def test_other_changes_keep_credentials(self):
+        self.auth.authenticate_credentials('lector', 'clave')
+        self.reader.last_login = timezone.now()
+        self.reader.save(update_fields=['last_login'])
+        self.user.first_name = 'Admin'
+        self.user.save()
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials('lector', 'clave')
+
+    def test_password_and_active_invalidate(self):
+        self.auth.authenticate_credentials('lector', 'clave')
+        self.reader.set_password('nueva')
+        self.reader.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials('lector', 'clave')
+        self.auth.authenticate_credentials('lector', 'nueva')
+        self.reader.is_active = False
+        self.reader.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials('lector', 'nueva')
+
+
+class EPSACacheTest(APITestCase):
+    def test_metadata(self):
+        EPSA.objects.create(code='EPSA1', name='EPSA 1', category='A', state='LP')
+        report = VariableReport.objects.create(epsa='EPSA1', year=2018)
+        self.assertEqual(report.get_category(), 'A')
+        with self.assertNumQueries(0):
+            self.assertEqual(epsa_cache.epsa_codes(state='LP'), ['EPSA1'])
+        EPSA.objects.filter(code='EPSA1').update(category='B')
+        self.assertEqual(epsa_cache.epsa_category('EPSA1'), 'A')
+        EPSA.objects.get(code='EPSA1').save()
+        epsa_cache._checked = 0.0
+        self.assertEqual(epsa_cache.epsa_category('EPSA1'), 'B')
+
+    @override_settings(EPSA_CACHE_CHECK_INTERVAL=0)
+    def test_changes(self):
+        EPSA.objects.create(code='EPSA1', name='EPSA 1', category='A', state='LP')
+        self.assertEqual(epsa_cache.epsa_state('EPSA1'), 'LP')
+        EPSA.objects.create(code='EPSA2', name='EPSA 2', category='B', state='LP')
+        self.assertEqual(epsa_cache.epsa_codes(state='LP', category='B'), ['EPSA2'])
+
+
+class ColumnPlanTest(APITestCase):
+    def assert_same_representation(self, serializer, queryset):
+        plan = ColumnPlan.for_serializer(serializer)
+        self.assertIsNotNone(plan)
+        expected = [serializer.to_representation(instance) for instance in queryset]
+        self.assertEqual([plan.represent(row) for row in plan.rows(queryset)], expected)
+        return expected
+
+    def test_epsa(self):
+        EPSA.objects.create(code='EPSA1', name='', state='LP', category='A')
+        EPSA.objects.create(code='EPSA2', name=None, state=None, category='B')
+        EPSA.objects.create(code='EPSA3', name='Tercera')
+        expected = self.assert_same_representation(EPSASerializer(), EPSA.objects.all())
+        by_code = {epsa['code']: epsa for epsa in json.loads(json.dumps(expected))}
+        self.assertNotIn('name', by_code['EPSA1'])
+        self.assertNotIn('state', by_code['EPSA2'])
+        self.assertEqual({epsa['code']: epsa for epsa in self.client.get('/api/epsas/').json()}, by_code)
+
+    def test_variable_report(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1.5, v1_type='NR', v2=0)
+        VariableReport.objects.create(epsa=None, year=2019, month=None, v3=2)
+        expected = self.assert_same_representation(VariableReportSerializer(), VariableReport.objects.all())
+        by_year = {report['year']: report for report in json.loads(json.dumps(expected))}
+        self.assertEqual((by_year[2018]['v1_type'], by_year[2018]['v2']), ('NR', 0.0))
+        self.assertEqual((by_year[2019]['epsa'], by_year[2019]['v1']), (None, None))
+        self.assertEqual({report['year']: report for report in self.client.get('/api/reports/').json()['results']}, by_year)
+
+    def test_plan_does_not_keep_serializer(self):
+        representation._plans.clear()
+        serializer = VariableReportSerializer(context={'request': None})
+        ColumnPlan.for_serializer(serializer)
+        reference = weakref.ref(serializer)
+        del serializer
+        gc.collect()
+        self.assertIsNone(reference())
+
+
+class FieldProjectionTest(APITestCase):
+    def queryset(self, url):
+        view = VariableReportViewSet(action_map={'get': 'list'}, format_kwarg=None, kwargs={})
+        view.request = view.initialize_request(APIRequestFactory().get(url))
+        return view.get_queryset()
+
+    def test_only(self):
+        names, defer = self.queryset('/api/reports/?fields=epsa,v1').query.deferred_loading
+        self.assertFalse(defer)
+        self.assertEqual(names, {'id', 'epsa', 'year', 'month', 'v1', 'modified'})
+        names, defer = self.queryset('/api/reports/?fields!=v1,v2').query.deferred_loading
+        self.assertFalse(defer)
+        self.assertTrue({'id', 'epsa', 'v3', 'v1_type'} <= names)
+        self.assertFalse({'v1', 'v2'} & names)
+        self.assertEqual(self.queryset('/api/reports/').query.deferred_loading, (frozenset(), True))
+
+    def test_selected_columns(self):
+        report = VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1.5, v2=2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/reports/{report.pk}/?fields=v1')
+        self.assertEqual(response.json(), {'v1': 1.5})
+        select = next(query['sql'] for query in queries if 'performance_variablereport' in query['sql'] and '"v1"' in query['sql'])
+        self.assertIn('"performance_variablereport"."id"', select)
+        self.assertNotIn('"v2"', select)
+
+
+class LongFormatTest(APITestCase):
+    def setUp(self):
+        super(LongFormatTest, self).setUp()
+        Variable.objects.create(code='vol_sup', var_id=2, name='Volumen superficial', unit='m3', var_type='volumen')
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1.5, v2=2, v2_type='NR', v5=5)
+        VariableReport.objects.create(epsa='EPSA2', year=2018, month=1, v2=3)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content).decode('utf-8'))
+
+    def test_vars(self):
+        rows = self.get('/api/reports/long/?vars=v1,vol_sup')
+        self.assertEqual([(row['epsa'], row['var_id'], row['value']) for row in rows], [
+            ('EPSA1', 1, 1.5), ('EPSA1', 2, 2.0), ('EPSA2', 2, 3.0),
+        ])
+        self.assertEqual(rows[0], {
+            'epsa': 'EPSA1', 'year': 2018, 'month': 1, 'var_id': 1, 'var_code': 'v1', 'var_name': None,
+            'unit': None, 'var_type': None, 'value': 1.5, 'type': 'VA',
+        })
+        self.assertEqual((rows[1]['var_code'], rows[1]['var_name'], rows[1]['unit'], rows[1]['type']), ('vol_sup', 'Volumen superficial', 'm3', 'NR'))
+        self.assertEqual([row['var_id'] for row in self.get('/api/reports/long/?vars=v2&epsa=EPSA2')], [2])
+
+    def test_all_variables(self):
+        rows = self.get('/api/reports/long/')
+        self.assertEqual([(row['epsa'], row['var_id']) for row in rows], [('EPSA1', 1), ('EPSA1', 2), ('EPSA1', 5), ('EPSA2', 2)])
+
+    def test_unknown_variable(self):
+        response = self.client.get('/api/reports/long/?vars=v1,v99,otra')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['vars'], ['Variable desconocida: v99.', 'Variable desconocida: otra.'])
+
+    def test_csv(self):
+        response = self.client.get('/api/reports/long/?vars=v5&format=csv')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        header, row = list(csv.reader(io.StringIO(content.lstrip('\ufeff'))))
+        self.assertEqual(header, list(unpivot.LONG_FIELDS))
+        self.assertEqual(row, ['EPSA1', '2018', '1', '5', 'v5', '', '', '', '5.0', 'VA'])
+
+
+class StreamingListTest(APITestCase):
+    def test_reports(self):
+        for epsa in ('EPSA2', 'EPSA1'):
+            for month in (1, 2, None):
+                VariableReport.objects.create(epsa=epsa, year=2018, month=month, v1=month, v2_type='NR')
+        response = self.client.get('/api/reports/?stream=1')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        streamed = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        page = self.client.get('/api/reports/')
+        self.assertFalse(page.streaming)
+        self.assertEqual(streamed, page.json()['results'])
+        self.assertEqual(len(streamed), 6)
+        filtered = json.loads(b''.join(self.client.get('/api/reports/?stream=1&epsa=EPSA1&fields=epsa,month').streaming_content))
+        self.assertEqual(filtered, self.client.get('/api/reports/?epsa=EPSA1&fields=epsa,month').json()['results'])
+
+
+class CSVExportTest(APITestCase):
+    def get_csv(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:])))
+
+    def test_reports(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1.5, v1_type='NR')
+        header, row = self.get_csv('/api/reports/?format=csv')
+        self.assertEqual(len(set(header)), len(header))
+        self.assertEqual(header[2:5], ['EPSA', 'Año', 'Mes'])
+        v1 = header.index(VariableReport._meta.get_field('v1').verbose_name)
+        self.assertEqual(header[v1 + 1:v1 + 4:2], ['Tipo de dato (v1_type)', 'Tipo de dato (v2_type)'])
+        self.assertNotIn('Tipo de dato', header)
+        self.assertEqual((row[2], row[v1], row[v1 + 1], row[v1 + 2]), ('EPSA1', '1.5', 'NR', ''))
+
+    def test_fields(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1.5)
+        header, row = self.get_csv('/api/reports/?format=csv&fields=epsa,v1,v1_type')
+        self.assertEqual(header, ['EPSA', VariableReport._meta.get_field('v1').verbose_name, 'Tipo de dato'])
+        self.assertEqual(row, ['EPSA1', '1.5', 'VA'])
+
+
+class DeltaSyncTest(APITestCase):
+    def setUp(self):
+        super(DeltaSyncTest, self).setUp()
+        self.past = timezone.now() - timedelta(days=2)
+        EPSA.objects.create(code='EPSA1', name='Antigua')
+        EPSA.objects.update(modified=self.past)
+        EPSA.objects.create(code='EPSA2', name='Nueva')
+
+    def codes(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sorted(epsa['code'] for epsa in response.json())
+
+    def test_modified_since(self):
+        since = self.past + timedelta(days=1)
+        self.assertEqual(self.codes('/api/epsas/'), ['EPSA1', 'EPSA2'])
+        self.assertEqual(self.codes(f'/api/epsas/?modified_since={since.isoformat().replace("+", "%2B")}'), ['EPSA2'])
+        self.assertEqual(self.codes(f'/api/epsas/?modified_since={since.timestamp()}'), ['EPSA2'])
+        self.assertEqual(self.codes(f'/api/epsas/?modified_since={self.past.date() - timedelta(days=1)}'), ['EPSA1', 'EPSA2'])
+
+    def test_invalid_modified_since(self):
+        for value in ('ayer', '2019-13-45', '1e400'):
+            response = self.client.get(f'/api/epsas/?modified_since={value}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('modified_since', response.json())
+        self.assertEqual(self.client.get('/api/epsas/deleted/?modified_since=ayer').status_code, 400)
+
+    def test_deleted(self):
+        EPSA.objects.get(code='EPSA1').delete()
+        deleted = self.client.get('/api/epsas/deleted/').json()
+        self.assertEqual([(t['object_id'], t['key']) for t in deleted], [('EPSA1', {'code': 'EPSA1'})])
+        self.assertEqual(self.client.get(f'/api/epsas/deleted/?modified_since={timezone.now().timestamp() + 60}').json(), [])
+        self.assertEqual(self.client.get('/api/variables/deleted/').json(), [])
+
+    @override_settings(TOMBSTONE_RETENTION_DAYS=30)
+    def test_retention(self):
+        EPSA.objects.all().delete()
+        Tombstone.objects.filter(object_id='EPSA1').update(deleted=timezone.now() - timedelta(days=31))
+        call_command('prune_tombstones', stdout=io.StringIO())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), ['EPSA2'])
+        old = (timezone.now() - timedelta(days=31)).timestamp()
+        self.assertEqual(self.client.get(f'/api/epsas/deleted/?modified_since={old}').status_code, 400)
+        with self.settings(TOMBSTONE_RETENTION_DAYS=None):
+            call_command('prune_tombstones', stdout=io.StringIO())
+            self.assertEqual(self.client.get(f'/api/epsas/deleted/?modified_since={old}').status_code, 200)
+        self.assertTrue(Tombstone.objects.exists())
+
+
+class DryRunTest(APITestCase):
+    def test_bulk_create(self):
+        VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1)
+        rows = [{'epsa': 'EPSA1', 'year': 2018, 'month': 1, 'v1': 2}, {'epsa': 'EPSA1', 'year': 2018, 'month': 2, 'v1': 3}]
+        response = self.client.post('/api/reports/?dry_run=1', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['simulacion'])
+        updated, created = response.data['resultados']
+        self.assertEqual(updated['cambios'], {'v1': [1.0, 2.0]})
+        self.assertIn('creado', created)
+        self.assertEqual(list(VariableReport.objects.values_list('month', 'v1')), [(1, 1.0)])
+
+    def test_import(self):
+        response = self.client.post(
+            '/api/reports/import/?dry_run=1', 'epsa,year,month,v1\nEPSA1,2018,1,5\nEPSA1,2018,2,abc\n', content_type='text/csv',
+        )
+        self.assertTrue(response.data['simulacion'])
+        self.assertEqual(response.data['resultados'], {'creado': 1, 'ignorado': 1})
+        self.assertFalse(VariableReport.objects.exists())
+
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        super(ResponseCacheTest, self).setUp()
+        self.report = VariableReport.objects.create(epsa='EPSA1', year=2018, month=1, v1=1)
+
+    def assertCached(self, url='/api/reports/'):
+        with self.assertNumQueries(0):
+            return self.client.get(url)
+
+    def test_hit(self):
+        first = self.client.get('/api/reports/')
+        second = self.assertCached()
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_invalidation(self):
+        self.client.get('/api/reports/')
+        self.client.post('/api/reports/', [{'epsa': 'EPSA1', 'year': 2018, 'month': 1, 'v1': 2}], format='json')
+        self.assertEqual(self.client.get('/api/reports/').data['results'][0]['v1'], 2.0)
+        self.report.refresh_from_db()
+        self.report.v1 = 3
+        self.report.save()
+        self.assertEqual(self.client.get('/api/reports/').data['results'][0]['v1'], 3.0)
+        self.report.delete()
+        self.assertEqual(self.client.get('/api/reports/').data['results'], [])
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/reports/')['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/reports/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_other_tables(self):
+        self.client.get('/api/reports/')
+        EPSA.objects.create(code='EPSA1', name='EPSA 1')
+        self.assertCached()
+
+    def test_html_not_cached(self):
+        self.client.get('/api/reports/', HTTP_ACCEPT='text/html')
+        response = self.client.get('/api/reports/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response_cache().entries), 0)
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        super(KeysetPaginationTest, self).setUp()
+        keys = [(epsa, year, month) for epsa in ('EPSA1', None, 'EPSA2') for year in (2016, 2017, 2018) for month in (3, None, 1, 2, 5)]
+        VariableReport.objects.bulk_create([VariableReport(epsa=epsa, year=year, month=month) for epsa, year, month in keys])
+
+    def pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def test_all_rows_once(self):
+        pages = self.pages('/api/reports/?page_size=10')
+        self.assertEqual([len(page['results']) for page in pages], [10, 10, 10, 10, 5])
+        keys = [(row.get('epsa'), row['year'], row.get('month')) for page in pages for row in page['results']]
+        nulls_last = lambda value: (value is None, value or 0)
+        self.assertEqual(keys, sorted(keys, key=lambda key: [nulls_last(value) for value in key]))
+        self.assertEqual(len(set(keys)), 45)
+
+    def test_previous(self):
+        pages = self.pages('/api/reports/?page_size=10')
+        self.assertIsNone(pages[0]['previous'])
+        previous = self.client.get(pages[2]['previous']).data
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/reports/?cursor=xyz').status_code, 404)
+
+
+class BulkImportTest(APITestCase):
+    def test_ndjson(self):
+        lines = [json.dumps({'epsa': 'EPSA1', 'year': 2018, 'month': month, 'v1': month}) for month in range(1, 6)]
+        body = '\n'.join(lines[:3] + ['"texto"'] + lines[3:]) + '\n'
+        response = self.client.post('/api/reports/import/?chunk_size=2', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['filas_confirmadas'], response.data['ultima_linea_confirmada']), (6, 6))
+        self.assertEqual(response.data['resultados'], {'creado': 5, 'ignorado': 1})
+        self.assertEqual(response.data['ignorados'][0]['linea'], 4)
+        self.assertEqual(VariableReport.objects.count(), 5)
+
+    def test_malformed_line(self):
+        lines = [json.dumps({'epsa': 'EPSA1', 'year': 2018, 'month': month}) for month in range(1, 4)]
+        body = '\n'.join(lines + ['{no es json'])
+        response = self.client.post('/api/reports/import/?chunk_size=2', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Línea 4', response.data['error'])
+        self.assertEqual(response.data['ultima_linea_confirmada'], 2)
+        self.assertEqual(VariableReport.objects.count(), 2)
+
+    def test_csv(self):
+        body = '\ufeffepsa,year,month,v1\nEPSA1,2018,1,1.5\nEPSA1,2018,1,2.5\n'
+        response = self.client.post('/api/reports/import/', body.encode('utf-8'), content_type='text/csv')
+        self.assertEqual(response.data['resultados'], {'creado': 1, 'actualizado': 1})
+        self.assertEqual(VariableReport.objects.get().v1, 2.5)
@@ -0,0 +1,81 @@
+import re
+from collections import OrderedDict
+from django.db import connection
+from rest_framework.exceptions import ValidationError
+from performance.models import Variable
+
+CHUNK_SIZE = 2000
+VARIABLE_FIELD = re.compile(r'^v(\d+)$')
+LONG_FIELDS = ('epsa', 'year', 'month', 'var_id', 'var_code', 'var_name', 'unit', 'var_type', 'value', 'type')
+
+
+def report_variables(model):
+    '''
+    Números de las variables de un reporte, según sus campos `v{i}`.
+    '''
+    matches = (VARIABLE_FIELD.match(field.name) for field in model._meta.concrete_fields)
+    return [int(match.group(1)) for match in matches if match]
+
+
+def resolve_variables(model, names):
+    '''
+    Números de las variables `names`, dadas por el nombre de su campo (`v3`) o por su código en el modelo `Variable`.
+    Sin nombres, retorna todas las variables del reporte.
+    '''
+    available = report_variables(model)
+    if not names:
+        return available
+    numbers = {}
+    codes = []
+    for name in names:
+        match = VARIABLE_FIELD.match(name)
+        if match:
+            numbers[name] = int(match.group(1))
+        else:
+            codes.append(name)
+    if codes:
+        numbers.update(Variable.objects.filter(code__in=codes).values_list('code', 'var_id'))
+    unknown = [name for name in names if numbers.get(name) not in available]
+    if unknown:
+        raise ValidationError({'vars': [f'Variable desconocida: {name}.' for name in unknown]})
+    return list(OrderedDict.fromkeys(numbers[name] for name in names))
+
+
+def long_sql(queryset, numbers):
+    '''
+    Consulta SQL que convierte los reportes de `queryset` al formato largo: una fila por reporte y variable de `numbers`
+    con valor no nulo, unida a los datos de la variable en `Variable`.
+
+    Los reportes se leen una sola vez: cada uno se cruza con la lista de variables y el valor y tipo se eligen con `CASE`.
+    '''
+    qn = connection.ops.quote_name
+    columns = ['epsa', 'year', 'month'] + [f'v{i}' for i in numbers] + [f'v{i}_type' for i in numbers]
+    reports, params = queryset.order_by().values(*columns).query.sql_with_params()
+    variables = ' UNION ALL '.join(f'SELECT {i:d} AS var_id' for i in numbers)
+    value = 'CASE u.var_id ' + ' '.join(f'WHEN {i:d} THEN r.{qn(f"v{i}")}' for i in numbers) + ' END'
+    value_type = 'CASE u.var_id ' + ' '.join(f'WHEN {i:d} THEN r.{qn(f"v{i}_type")}' for i in numbers) + ' END'
+    sql = (
+        f'SELECT r.{qn("epsa")}, r.{qn("year")}, r.{qn("month")}, u.var_id, var.{qn("code")}, var.{qn("name")}, '
+        f'var.{qn("unit")}, var.{qn("var_type")}, {value}, {value_type} '
+        f'FROM ({reports}) r CROSS JOIN ({variables}) u '
+        f'LEFT JOIN {qn(Variable._meta.db_table)} var ON var.{qn("var_id")} = u.var_id '
+        f'WHERE {value} IS NOT NULL '
+        f'ORDER BY r.{qn("epsa")}, r.{qn("year")}, r.{qn("month")}, u.var_id'
+    )
+    return sql, params
+
+
+def iter_long(queryset, numbers, chunk_size=CHUNK_SIZE):
+    '''
+    Retorna las filas en formato largo de los reportes de `queryset` como diccionarios, leyéndolas por grupos de `chunk_size`
+    con un cursor del servidor.
+    '''
+    sql, params = long_sql(queryset, numbers)
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        for rows in iter(lambda: cursor.fetchmany(chunk_size), []):
+            for row in rows:
+                item = OrderedDict(zip(LONG_FIELDS, row))
+                if item['var_code'] is None:
+                    item['var_code'] = f'v{item["var_id"]}'
+                yield item
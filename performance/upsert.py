@@ -0,0 +1,319 @@
+from django.core.exceptions import ValidationError
+from collections import OrderedDict
+from django.db import transaction
+from django.db.models import Q
+from performance.signals import bulk_change
+from performance.validation import BatchValidator
+
+NOT_IDENTIFIABLE = 'No se proporcionaron todos los campos necesarios para identificar la instancia de manera única.'
+BLANK_OBJECT = 'Todas las propiedades clave de este objeto estan en blanco.'
+INVALID_OBJECT = 'El objeto ingresado no es un objeto JSON.'
+DEFAULT_BATCH_SIZE = 500
+
+
+def model_props(model, props, exclude=()):
+    '''
+    Filtra las propiedades de un objeto ingresado dejando sólo los campos concretos del modelo (sin la llave primaria).
+    '''
+    names = {field.name for field in model._meta.concrete_fields if not field.primary_key}
+    return {k: v for k, v in props.items() if k in names and k not in exclude}
+
+
+class BulkUpsert:
+    '''
+    Crea o actualiza en masa las instancias de un modelo identificadas por los campos `unique_together`.
+
+    Todas las instancias existentes del lote se obtienen con una sola consulta y las escrituras se realizan
+    con `bulk_create` y `bulk_update` dentro de una misma transacción. El reporte por fila mantiene el
+    formato `creado`/`actualizado`/`ignorado` de la carga fila por fila, además de `sin_cambios` para las filas
+    idénticas a las guardadas, que no son escritas.
+
+    Las filas se validan por columnas con `BatchValidator` (o se usan los errores `errors` ya calculados, paralelos a `data`)
+    y las filas inválidas se reportan como `ignorado` con el motivo `invalido`, al igual que las filas que crean una instancia
+    sin todos los campos obligatorios del modelo. Con `clean_fields`, los valores que tendría cada instancia se verifican además
+    con `clean_fields` del modelo, como lo haría `full_clean` al guardar la instancia con `save`.
+
+    Las escrituras se dividen en consultas de a lo sumo `batch_size` instancias: sin ese límite, `bulk_update` de un modelo con
+    muchas columnas (como `VariableReport`) genera una sola consulta con un `CASE WHEN` por columna y por fila del lote.
+    '''
+    def __init__(self, model, data, unique_together, batch_size=DEFAULT_BATCH_SIZE, errors=None, clean_fields=False):
+        self.model = model
+        self.unique_together = list(unique_together)
+        self.batch_size = batch_size
+        self.clean_fields = clean_fields
+        self.fields = {field.name: field for field in model._meta.concrete_fields}
+        self.rows = [self._parse(props) for props in data]
+        self.existing = None
+        self.validator = BatchValidator(model)
+        if errors is None:
+            errors = self.validator.validate(data)
+        for row, row_errors in zip(self.rows, errors):
+            if row_errors and row['action'] != 'ignorado':
+                self.ignore(row, 'invalido', row_errors)
+
+    def _parse(self, props):
+        row = dict(props=props, key=None, instance=None, action=None, detail=None, changes=None)
+        if not isinstance(props, dict):
+            return self.ignore(row, 'objeto_invalido', INVALID_OBJECT)
+        if not set(self.unique_together) <= set(props.keys()):
+            return self.ignore(row, 'no_identificable', NOT_IDENTIFIABLE)
+        key_vals = [props.get(key_prop) for key_prop in self.unique_together]
+        if not any(key_vals):
+            return self.ignore(row, 'objeto_en_blanco', BLANK_OBJECT)
+        try:
+            row['key'] = tuple(self.fields[k].to_python(v) for k, v in zip(self.unique_together, key_vals))
+        except ValidationError as e:
+            return self.ignore(row, 'valor_invalido', ' '.join(e.messages))
+        return row
+
+    def ignore(self, row, reason, message):
+        row['key'] = None
+        row['action'] = 'ignorado'
+        row['detail'] = {reason: message}
+        return row
+
+    @property
+    def pending_rows(self):
+        return [row for row in self.rows if row['action'] != 'ignorado']
+
+    def _key_filter(self, keys):
+        '''
+        Filtro que abarca todas las llaves del lote. Puede devolver instancias de más, que son descartadas al comparar la llave completa.
+        '''
+        key_filter = Q()
+        for i, key_prop in enumerate(self.unique_together):
+            values = {key[i] for key in keys}
+            field_filter = Q(**{f'{key_prop}__in': [v for v in values if v is not None]})
+            if None in values:
+                field_filter |= Q(**{f'{key_prop}__isnull': True})
+            key_filter &= field_filter
+        return key_filter
+
+    def instance_key(self, instance):
+        return tuple(getattr(instance, key_prop) for key_prop in self.unique_together)
+
+    def fetch_existing(self):
+        keys = {row['key'] for row in self.pending_rows}
+        existing = {}
+        if keys:
+            qs = self.model.objects.filter(self._key_filter(keys)).select_for_update()
+            for instance in qs:
+                key = self.instance_key(instance)
+                if key in keys:
+                    existing[key] = instance
+        return existing
+
+    def resolve(self):
+        '''
+        Obtiene las instancias existentes del lote y decide la acción de cada fila.
+        Las filas repetidas dentro del lote se aplican en orden sobre la misma instancia y
+        las filas que no modifican ningún valor guardado son reportadas como `sin_cambios`.
+        '''
+        if self.existing is None:
+            self.existing = self.fetch_existing()
+        self.to_create = []
+        self.to_update = {}
+        self.update_fields = set()
+        self.created = created = {}
+        for row in self.pending_rows:
+            key = row['key']
+            is_new = key not in self.existing
+            try:
+                values = self._coerce(row['props'], is_new)
+            except ValidationError as e:
+                self.ignore(row, 'valor_invalido', ' '.join(e.messages))
+                continue
+            if is_new and key not in created:
+                missing = self.validator.missing(row['props'])
+                if missing:
+                    self.ignore(row, 'invalido', missing)
+                    continue
+            if self.clean_fields:
+                try:
+                    self._clean(key, values)
+                except ValidationError as e:
+                    self.ignore(row, 'invalido', e.message_dict)
+                    continue
+            if not is_new:
+                instance = self.existing[key]
+                changed = [field for field, value in values if getattr(instance, field.attname) != value]
+                values = [(field, value) for field, value in values if field in changed]
+                row['changes'] = OrderedDict((field.name, [getattr(instance, field.attname), value]) for field, value in values)
+                if changed:
+                    self.to_update[key] = instance
+                    self.update_fields.update(field.name for field in changed)
+                    row['action'] = 'actualizado'
+                else:
+                    row['action'] = 'sin_cambios'
+            elif key in created:
+                instance = created[key]
+                row['action'] = 'actualizado'
+            else:
+                instance = self.model()
+                created[key] = instance
+                self.to_create.append(instance)
+                row['action'] = 'creado'
+            for field, value in values:
+                setattr(instance, field.attname, value)
+            row['instance'] = instance
+
+    def _clean(self, key, values):
+        '''
+        Verifica con `clean_fields` una copia de la instancia de la llave `key` (o una instancia nueva) con los valores `values` aplicados.
+        '''
+        instance = self.existing.get(key) or self.created.get(key)
+        candidate = self.model()
+        if instance is not None:
+            for field in self.fields.values():
+                setattr(candidate, field.attname, getattr(instance, field.attname))
+        for field, value in values:
+            setattr(candidate, field.attname, value)
+        candidate.clean_fields()
+
+    def _coerce(self, props, is_new):
+        values = []
+        for name, value in props.items():
+            field = self.fields.get(name)
+            if field is None or getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                continue
+            if not is_new and (field.primary_key or name in self.unique_together):
+                continue
+            values.append((field, field.to_python(value)))
+        return values
+
+    def mark_changed(self, row, name=None, change=None):
+        '''
+        Marca como actualizada una fila sin cambios propios, por ejemplo, cuando sus filas hijas cambiaron.
+        El cambio `change` se agrega a las diferencias de la fila bajo el nombre `name`.
+        '''
+        if row['action'] == 'sin_cambios':
+            row['action'] = 'actualizado'
+            self.to_update[row['key']] = row['instance']
+        if name is not None and row['changes'] is not None:
+            row['changes'][name] = change
+
+    def save(self):
+        if self.to_create:
+            self.model.objects.bulk_create(self.to_create, batch_size=self.batch_size)
+            if any(instance.pk is None for instance in self.to_create):
+                self._fetch_created_pks()
+        if self.to_update:
+            instances = list(self.to_update.values())
+            update_fields = sorted(self.update_fields)
+            for field in self.fields.values():
+                if getattr(field, 'auto_now', False):
+                    for instance in instances:
+                        field.pre_save(instance, add=False)
+                    update_fields.append(field.name)
+            if update_fields:
+                self.model.objects.bulk_update(instances, update_fields, batch_size=self.batch_size)
+        if self.to_create or self.to_update:
+            bulk_change.send(sender=self.model)
+
+    def _fetch_created_pks(self):
+        qs = self.model.objects.filter(self._key_filter(self.created.keys()))
+        for instance in qs:
+            key = self.instance_key(instance)
+            if key in self.created:
+                self.created[key].pk = instance.pk
+
+    def report(self, diffs=False):
+        '''
+        Reporte por fila. Con `diffs`, las filas actualizadas incluyen los cambios por campo (`cambios`: `{campo: [anterior, nuevo]}`).
+        '''
+        report = []
+        for row in self.rows:
+            result = {row['action']: row['detail'] if row['action'] == 'ignorado' else row['props']}
+            if diffs and row['action'] == 'actualizado' and row['changes'] is not None:
+                result['cambios'] = row['changes']
+            report.append(result)
+        return report
+
+    def run(self, dry_run=False):
+        '''
+        Aplica el lote. Con `dry_run` sólo se calculan las acciones y las diferencias de cada fila, sin escribir nada.
+        '''
+        with transaction.atomic():
+            self.resolve()
+            if dry_run:
+                return self.report(diffs=True)
+            self.save()
+        return self.report()
+
+
+def _child_fields(child_model, fk_name):
+    return [
+        field for field in child_model._meta.concrete_fields
+        if not field.primary_key and field.name != fk_name
+        and not getattr(field, 'auto_now', False) and not getattr(field, 'auto_now_add', False)
+    ]
+
+
+def _children_changed(fields, data_list, stored_list):
+    if len(data_list) != len(stored_list):
+        return True
+    for data, stored in zip(data_list, stored_list):
+        for field in fields:
+            try:
+                value = field.to_python(data.get(field.name, field.get_default()))
+            except ValidationError:
+                return True
+            if value != stored[field.attname]:
+                return True
+    return False
+
+
+def collect_children(upsert, children, child_model, fk_name, name=None):
+    '''
+    Agrupa por instancia padre las filas hijas ingresadas (`children` es paralela a `upsert.rows`; la última fila de cada padre prevalece).
+
+    Las filas hijas guardadas de los padres existentes se obtienen con una sola consulta: los padres cuyas filas hijas no cambiaron son
+    descartados y las filas padre con filas hijas modificadas son marcadas como actualizadas. Debe llamarse después de `upsert.resolve()`.
+    Si se da `name`, las filas hijas anteriores y nuevas se agregan bajo ese nombre a las diferencias de la fila padre.
+    '''
+    collected = OrderedDict()
+    rows = {}
+    for row, data_list in zip(upsert.rows, children):
+        if row['action'] == 'ignorado' or not data_list:
+            continue
+        instance = row['instance']
+        data_list = [model_props(child_model, data, exclude=(fk_name,)) for data in data_list if isinstance(data, dict)]
+        collected[id(instance)] = (instance, data_list)
+        rows[id(instance)] = row
+
+    existing_ids = {id(instance) for instance in upsert.existing.values()}
+    fk_attname = child_model._meta.get_field(fk_name).attname
+    stored = {}
+    parent_pks = [instance.pk for key, (instance, data_list) in collected.items() if key in existing_ids]
+    if parent_pks:
+        for values in child_model.objects.filter(**{f'{fk_name}__in': parent_pks}).order_by('pk').values():
+            stored.setdefault(values[fk_attname], []).append(values)
+
+    fields = _child_fields(child_model, fk_name)
+    for key, (instance, data_list) in list(collected.items()):
+        stored_list = stored.get(instance.pk, [])
+        if key in existing_ids and not _children_changed(fields, data_list, stored_list):
+            del collected[key]
+        elif name is None:
+            upsert.mark_changed(rows[key])
+        else:
+            previous = [{field.name: values[field.attname] for field in fields} for values in stored_list]
+            upsert.mark_changed(rows[key], name, [previous, data_list])
+    return list(collected.values())
+
+
+def replace_children(child_model, fk_name, collected, batch_size=DEFAULT_BATCH_SIZE):
+    '''
+    Reemplaza las filas hijas de los padres agrupados por `collect_children` con una eliminación y una inserción en masa
+    (en consultas de a lo sumo `batch_size` filas).
+    '''
+    if not collected:
+        return
+    fk_attname = child_model._meta.get_field(fk_name).attname
+    child_model.objects.filter(**{f'{fk_name}__in': [instance.pk for instance, data_list in collected]}).delete()
+    child_model.objects.bulk_create([
+        child_model(**{fk_attname: instance.pk}, **data)
+        for instance, data_list in collected for data in data_list
+    ], batch_size=batch_size)
+    bulk_change.send(sender=child_model)
+
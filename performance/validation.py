@@ -0,0 +1,116 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxLengthValidator, MaxValueValidator, MinValueValidator
+from django.db import models
+
+REQUIRED_FIELD = 'Este campo es requerido.'
+
+
+class FieldPlan:
+    '''
+    Verificaciones de un campo del modelo preparadas una sola vez: conversión de tipo, nulos, opciones, longitud máxima y rangos.
+    Un campo es obligatorio (`required`) al crear una instancia si no acepta nulos ni blancos y no tiene valor por defecto.
+    '''
+    def __init__(self, field):
+        self.field = field
+        self.required = not (field.has_default() or field.blank or field.null)
+        self.choices = {choice for choice, label in field.flatchoices} if field.choices else None
+        self.validators = [
+            validator for validator in field.validators
+            if isinstance(validator, (MaxLengthValidator, MinValueValidator, MaxValueValidator))
+        ]
+        if isinstance(field, (models.PositiveIntegerField, models.PositiveSmallIntegerField)):
+            self.validators.append(MinValueValidator(0))
+
+    def check(self, value):
+        '''
+        Retorna la lista de errores del valor o `None` si es válido.
+        '''
+        field = self.field
+        if value is None:
+            return None if field.null else [field.error_messages['null']]
+        try:
+            value = field.to_python(value)
+        except ValidationError as e:
+            return e.messages
+        if self.choices is not None and value not in self.choices and value not in field.empty_values:
+            return [field.error_messages['invalid_choice'] % {'value': value}]
+        for validator in self.validators:
+            try:
+                validator(value)
+            except ValidationError as e:
+                return e.messages
+        return None
+
+
+class BatchValidator:
+    '''
+    Valida un lote de objetos por columnas contra las restricciones del modelo.
+
+    Las verificaciones de cada campo se preparan una sola vez y se aplican columna por columna sobre todo el lote,
+    en lugar de construir un serializador por fila. Los campos que no pertenecen al modelo son ignorados, al igual que
+    los campos ausentes, por lo que un objeto puede actualizar sólo algunos campos de una instancia. Los campos obligatorios
+    ausentes se verifican con `missing` para los objetos que crean una instancia, y siempre para los objetos anidados, que
+    siempre se crean.
+    '''
+    def __init__(self, model, nested=None, required=False):
+        self.required = required
+        self.plans = {
+            field.name: FieldPlan(field) for field in model._meta.concrete_fields
+            if not isinstance(field, models.AutoField) and not field.is_relation
+            and not getattr(field, 'auto_now', False) and not getattr(field, 'auto_now_add', False)
+        }
+        self.nested = {name: BatchValidator(nested_model, required=True) for name, nested_model in (nested or {}).items()}
+
+    def validate(self, data):
+        '''
+        Retorna una lista paralela a `data` con los errores de cada objeto (`{campo: [mensajes]}`) o `None` si el objeto es válido.
+        '''
+        errors = [None] * len(data)
+        rows = [(i, props) for i, props in enumerate(data) if isinstance(props, dict)]
+        columns = set()
+        for i, props in rows:
+            columns.update(props.keys())
+        for name in columns:
+            if name in self.plans:
+                check = self.plans[name].check
+                for i, props in rows:
+                    if name in props:
+                        messages = check(props[name])
+                        if messages:
+                            errors[i] = errors[i] or {}
+                            errors[i][name] = messages
+            elif name in self.nested:
+                self._validate_nested(name, rows, errors)
+        if self.required:
+            for i, props in rows:
+                missing = self.missing(props)
+                if missing:
+                    errors[i] = dict(errors[i] or {}, **missing)
+        return errors
+
+    def missing(self, props):
+        '''
+        Errores de los campos obligatorios ausentes o nulos en `props` (`{campo: [mensajes]}`) o `None` si no falta ninguno.
+        '''
+        missing = {name: [REQUIRED_FIELD] for name, plan in self.plans.items() if plan.required and props.get(name) is None}
+        return missing or None
+
+    def _validate_nested(self, name, rows, errors):
+        '''
+        Valida juntos los objetos anidados de todo el lote. Un objeto anidado único se trata como una lista de un elemento.
+        '''
+        owners = []
+        nested_data = []
+        for i, props in rows:
+            value = props.get(name)
+            items = [value] if isinstance(value, dict) else value if isinstance(value, list) else []
+            for position, item in enumerate(items):
+                owners.append((i, position, isinstance(value, dict)))
+                nested_data.append(item)
+        for (i, position, single), nested_errors in zip(owners, self.nested[name].validate(nested_data)):
+            if nested_errors:
+                errors[i] = errors[i] or {}
+                if single:
+                    errors[i][name] = nested_errors
+                else:
+                    errors[i].setdefault(name, {})[position] = nested_errors
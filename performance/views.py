@@ -1,22 +1,365 @@
+import calendar
+import hashlib
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, time
+from django.db import DatabaseError
+from django.db.models import Count, Max, prefetch_related_objects
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from performance import models, serializers
+from performance.streaming import iter_csv_rows, iter_json_array, iter_ndjson_rows
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from performance import columnar, jobs, unpivot
+from performance.cache import response_cache, response_key, table_versions
+from performance.pagination import KeysetPagination
+from performance.upsert import DEFAULT_BATCH_SIZE
+from performance.renderers import CSVRenderer, csv_headers, iter_csv
+from performance.signals import tombstone_cutoff
+from performance.representation import ColumnPlan
 from rest_framework import status
 
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_CHUNK_SIZE = 10000
+STREAM_CHUNK_SIZE = 2000
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Content-Disposition')
+
 class CustomViewSet(viewsets.ModelViewSet):
+    upsert_batch_size = DEFAULT_BATCH_SIZE
+
     def get_serializer(self, *args, **kwargs):
         if isinstance(kwargs.get('data', {}), list):
             kwargs['many'] = True
         return super(CustomViewSet, self).get_serializer(*args, **kwargs)
 
+    def get_serializer_context(self):
+        context = super(CustomViewSet, self).get_serializer_context()
+        context['dry_run'] = jobs.is_dry_run(self.request)
+        context['batch_size'] = self.upsert_batch_size
+        return context
+
     def create(self, request, *args, **kwargs):
+        if jobs.is_dry_run(request):
+            serializer = self.get_serializer(data=request.data if isinstance(request.data, list) else [request.data])
+            serializer.is_valid(raise_exception=False)
+            return Response({'simulacion': True, 'resultados': serializer.save()}, status=status.HTTP_200_OK)
+        if jobs.is_async_request(request):
+            job = jobs.enqueue(request, self.get_serializer_class(), self.get_serializer_context())
+            url = reverse('importjob-detail', kwargs={'pk': job.pk}, request=request)
+            return Response({'job': job.pk, 'status': job.status, 'url': url}, status=status.HTTP_202_ACCEPTED)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=False)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.initial_data)
         return Response(serializer.instance, status=status.HTTP_201_CREATED)
 
-class EPSAViewSet(CustomViewSet):
+class BulkImportMixin:
+    '''
+    Añade el punto de acceso `import/`, que ingresa un cuerpo NDJSON o CSV de manera incremental confirmando las filas en grupos.
+    '''
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        summary = OrderedDict(filas_confirmadas=0, ultima_linea_confirmada=0, resultados=OrderedDict(), ignorados=[])
+        if request.stream is None:
+            summary['error'] = 'El cuerpo del pedido está vacío.'
+            return Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunk_size = min(int(request.query_params.get('chunk_size', IMPORT_CHUNK_SIZE)), IMPORT_MAX_CHUNK_SIZE)
+        except ValueError:
+            chunk_size = IMPORT_CHUNK_SIZE
+        chunk_size = max(chunk_size, 1)
+
+        if 'csv' in request.content_type:
+            names = {header: name for name, header in csv_headers(self.get_serializer()).items()}
+            rows = ((line_number, {names.get(k, k): v for k, v in props.items()}) for line_number, props in iter_csv_rows(request.stream))
+        else:
+            rows = iter_ndjson_rows(request.stream)
+
+        model = self.get_queryset().model
+        dry_run = jobs.is_dry_run(request)
+        if dry_run:
+            summary['simulacion'] = True
+        chunk = []
+        try:
+            for line_number, props in rows:
+                chunk.append((line_number, props))
+                if len(chunk) >= chunk_size:
+                    self.import_chunk(model, chunk, summary, dry_run)
+                    chunk = []
+            self.import_chunk(model, chunk, summary, dry_run)
+        except (ValueError, DatabaseError) as e:
+            summary['error'] = str(e)
+            return Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+    def import_chunk(self, model, chunk, summary, dry_run=False):
+        if not chunk:
+            return
+        unique_together = model._meta.unique_together[0]
+        report = serializers.bulk_create_or_update(
+            model, [props for line_number, props in chunk], unique_together, dry_run=dry_run, batch_size=self.upsert_batch_size,
+        )
+        for (line_number, props), result in zip(chunk, report):
+            ret_key = next(iter(result))
+            summary['resultados'][ret_key] = summary['resultados'].get(ret_key, 0) + 1
+            if ret_key == 'ignorado':
+                summary['ignorados'].append(OrderedDict(linea=line_number, **result))
+        summary['filas_confirmadas'] += len(chunk)
+        summary['ultima_linea_confirmada'] = chunk[-1][0]
+
+def projected_fields(model, serializer):
+    '''
+    Campos del modelo que necesita el serializador (ya filtrado por `fields`/`fields!`), más la llave primaria, los campos del orden
+    del modelo y `modified`. Retorna `None` si algún campo del serializador no corresponde a un campo del modelo o a una relación inversa.
+    '''
+    opts = model._meta
+    concrete = {field.name for field in opts.concrete_fields}
+    related = {field.get_accessor_name() for field in opts.related_objects}
+    names = [opts.pk.name]
+    for field in serializer._readable_fields:
+        if field.source in concrete:
+            names.append(field.source)
+        elif field.source not in related:
+            return None
+    names += [name.lstrip('-') for name in opts.ordering if name.lstrip('-') in concrete]
+    if 'modified' in concrete:
+        names.append('modified')
+    return list(OrderedDict.fromkeys(names))
+
+class FieldProjectionMixin:
+    '''
+    En los pedidos GET con los parámetros `fields` o `fields!`, la consulta sólo lee las columnas de los campos pedidos (con `.only()`)
+    en lugar de todas las columnas del modelo.
+    '''
+    def get_queryset(self):
+        queryset = super(FieldProjectionMixin, self).get_queryset()
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET':
+            return queryset
+        if 'fields' not in request.query_params and 'fields!' not in request.query_params:
+            return queryset
+        names = projected_fields(queryset.model, self.get_serializer())
+        return queryset.only(*names) if names else queryset
+
+class CachedListMixin:
+    '''
+    Guarda las respuestas de `list` en el caché de respuestas (`RESPONSE_CACHE`), identificadas por la ruta, los parámetros del pedido,
+    el formato y las versiones de las tablas de `cache_models` (por defecto, la del modelo del punto de acceso). Cada escritura en esas
+    tablas cambia su versión, por lo que una respuesta guardada nunca es retornada después de un cambio en sus datos.
+
+    Las respuestas HTML de la API navegable no se guardan, ya que contienen datos del usuario.
+
+    Los puntos de acceso que construyen la lista de otra forma sobrescriben `uncached_list` en lugar de `list`.
+    '''
+    cache_models = None
+
+    def list(self, request, *args, **kwargs):
+        if getattr(request, 'accepted_media_type', '').startswith('text/html'):
+            return self.uncached_list(request, *args, **kwargs)
+        versions = table_versions(self.cache_models or (self.queryset.model,))
+        self.response_cache_key = response_key(request, versions)
+        cached = response_cache().get(self.response_cache_key)
+        if cached is None:
+            return self.uncached_list(request, *args, **kwargs)
+        etag = cached['headers'].get('ETag')
+        if etag:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+        response = HttpResponse(cached['content'], content_type=cached['content_type'], status=cached['status'])
+        for header, value in cached['headers'].items():
+            response[header] = value
+        return response
+
+    def uncached_list(self, request, *args, **kwargs):
+        return super(CachedListMixin, self).list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(CachedListMixin, self).finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, 'response_cache_key', None)
+        if key is not None and isinstance(response, Response) and response.status_code == 200:
+            response.render()
+            response_cache().set(key, {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'status': response.status_code,
+                'headers': {header: response[header] for header in CACHED_HEADERS if response.has_header(header)},
+            })
+        return response
+
+class DeltaSyncMixin:
+    '''
+    Sincronización incremental para los modelos con el campo `modified`: el parámetro `modified_since` limita las instancias a las modificadas
+    desde esa fecha y el punto de acceso `deleted/` retorna las instancias eliminadas (desde esa fecha, si se da el parámetro).
+
+    Las eliminaciones se conservan `TOMBSTONE_RETENTION_DAYS` días (`manage.py prune_tombstones`). `deleted/` rechaza las fechas anteriores
+    a ese periodo, ya que pueden faltar eliminaciones: el cliente debe volver a sincronizar todas las instancias.
+    '''
+    def get_modified_since(self):
+        value = self.request.query_params.get('modified_since')
+        if not value:
+            return None
+        try:
+            since = parse_datetime(value) or parse_date(value)
+        except ValueError:
+            since = None
+        if since is None:
+            try:
+                return datetime.fromtimestamp(float(value), tz=timezone.utc)
+            except (ValueError, OverflowError, OSError):
+                raise ValidationError({'modified_since': 'Fecha no válida. Use el formato ISO 8601 (por ejemplo, 2019-06-01T12:00:00Z) o segundos desde 1970.'})
+        if not isinstance(since, datetime):
+            since = datetime.combine(since, time.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def filter_queryset(self, queryset):
+        queryset = super(DeltaSyncMixin, self).filter_queryset(queryset)
+        since = self.get_modified_since()
+        if since is not None:
+            queryset = queryset.filter(modified__gte=since)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def deleted(self, request):
+        tombstones = models.Tombstone.objects.filter(model=self.get_queryset().model._meta.label_lower)
+        since = self.get_modified_since()
+        cutoff = tombstone_cutoff()
+        if since is not None and cutoff is not None and since < cutoff:
+            raise ValidationError({'modified_since': 'Las eliminaciones anteriores a esta fecha ya no están disponibles. Sincronice todas las instancias.'})
+        if since is not None:
+            tombstones = tombstones.filter(deleted__gte=since)
+        return Response([OrderedDict(object_id=t.object_id, key=t.key, deleted=t.deleted) for t in tombstones])
+
+class ConditionalGetMixin:
+    '''
+    Añade los headers `ETag` y `Last-Modified` a las respuestas de `list` y `retrieve` de los modelos con el campo `modified`, y responde
+    `304 Not Modified` a los pedidos con `If-None-Match` o `If-Modified-Since` vigentes sin serializar nada.
+
+    El `ETag` de una lista se calcula con una sola consulta (fecha de modificación más reciente y número de instancias del queryset filtrado).
+    Su `Last-Modified` es la fecha del último cambio en toda la tabla, incluidas las eliminaciones (`Tombstone`), ya que una instancia
+    eliminada o que deja de cumplir los filtros no cambia la fecha de modificación más reciente del queryset filtrado.
+    '''
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not self.is_conditional(queryset.model):
+            return super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        validators = queryset.aggregate(last_modified=Max('modified'), count=Count('pk'))
+        get_response = lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        version = f'{validators["last_modified"].isoformat() if validators["last_modified"] else ""}|{validators["count"]}'
+        return self.conditional_response(request, self.table_last_modified(queryset.model), version, get_response)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.is_conditional(self.get_queryset().model):
+            return super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        version = f'{instance.modified.isoformat() if instance.modified else ""}|{instance.pk}'
+        return self.conditional_response(request, instance.modified, version, lambda: Response(self.get_serializer(instance).data))
+
+    def is_conditional(self, model):
+        return any(field.name == 'modified' for field in model._meta.concrete_fields)
+
+    def table_last_modified(self, model):
+        modified = model._default_manager.aggregate(last=Max('modified'))['last']
+        deleted = models.Tombstone.objects.filter(model=model._meta.label_lower).aggregate(last=Max('deleted'))['last']
+        return max((date for date in (modified, deleted) if date is not None), default=None)
+
+    def conditional_response(self, request, last_modified, version, get_response):
+        media_type = getattr(request, 'accepted_media_type', '')
+        key = f'{request.get_full_path()}|{media_type}|{version}'
+        etag = '"' + hashlib.md5(key.encode('utf-8')).hexdigest() + '"'
+        timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = get_response()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+def iter_instances(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Instancias del queryset leídas por grupos de `chunk_size` con un cursor del servidor. Como `iterator()` ignora `prefetch_related`,
+    los objetos relacionados se obtienen para cada grupo con una consulta por relación.
+    '''
+    lookups = queryset._prefetch_related_lookups
+    instances = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(instances, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield from chunk
+
+class StreamingListMixin:
+    '''
+    Con el parámetro `stream=1` o en formato CSV (`format=csv`), `list` retorna todas las instancias filtradas sin paginar, leyéndolas
+    de la base de datos por grupos con un cursor del servidor y escribiendo la respuesta a medida que se leen.
+
+    Si el serializador lo permite, las instancias se representan con un `ColumnPlan` a partir de `values_list()`. Con paginación
+    por llaves, las instancias se retornan en el mismo orden que las páginas.
+    '''
+    def list(self, request, *args, **kwargs):
+        is_csv = isinstance(getattr(request, 'accepted_renderer', None), CSVRenderer)
+        streaming = is_csv or request.query_params.get('stream', '').lower() in ('1', 'true')
+        serializer = self.get_serializer()
+        plan = ColumnPlan.for_serializer(serializer)
+        if not streaming and plan is None:
+            return super(StreamingListMixin, self).list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+
+        if not streaming:
+            rows = plan.rows(queryset)
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                return self.get_paginated_response([plan.represent(row) for row in page])
+            return Response([plan.represent(row) for row in rows])
+
+        if hasattr(self.paginator, 'sort_queryset'):
+            queryset = self.paginator.sort_queryset(queryset, request, self)
+        if plan is None:
+            items = (serializer.to_representation(instance) for instance in iter_instances(queryset))
+        else:
+            items = (plan.represent(row) for row in plan.rows(queryset).iterator(chunk_size=STREAM_CHUNK_SIZE))
+        if is_csv:
+            response = StreamingHttpResponse(iter_csv(items, csv_headers(serializer)), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="{queryset.model._meta.model_name}.csv"'
+            return response
+        return StreamingHttpResponse(iter_json_array(items), content_type='application/json')
+
+class ColumnarExportMixin:
+    '''
+    Añade los puntos de acceso `arrow/` y `parquet/`, que exportan las instancias filtradas en formato columnar (Arrow IPC o Parquet).
+    '''
+    @action(detail=False, methods=['get'])
+    def arrow(self, request):
+        return self.columnar_response(request, 'arrow')
+
+    @action(detail=False, methods=['get'])
+    def parquet(self, request):
+        return self.columnar_response(request, 'parquet')
+
+    def columnar_response(self, request, output_format):
+        if columnar.pyarrow is None:
+            return Response({'error': 'La exportación en formato columnar requiere el paquete pyarrow.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        queryset = self.filter_queryset(self.get_queryset())
+        names = [name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()]
+        fields = columnar.export_fields(queryset.model, names)
+        content_type, extension = columnar.FORMATS[output_format]
+        response = StreamingHttpResponse(columnar.iter_columnar(queryset, fields, output_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{queryset.model._meta.model_name}.{extension}"'
+        return response
+
+class EPSAViewSet(CachedListMixin, FieldProjectionMixin, DeltaSyncMixin, ConditionalGetMixin, StreamingListMixin, CustomViewSet):
     '''
     list:
     Retorna un conjunto de instancias del modelo `EPSA`.
@@ -139,7 +482,7 @@ class EPSAViewSet(CustomViewSet):
     filterset_fields = ('code','state','category',)
 
 
-class VariableViewSet(CustomViewSet):
+class VariableViewSet(CachedListMixin, FieldProjectionMixin, DeltaSyncMixin, ConditionalGetMixin, StreamingListMixin, CustomViewSet):
     '''
     list:
     Retorna un conjunto de instancias del modelo `Variable`.
@@ -263,7 +606,7 @@ class VariableViewSet(CustomViewSet):
     queryset = models.Variable.objects.all()
     filterset_fields = ('code','var_id')
 
-class IndicatorViewSet(CustomViewSet):
+class IndicatorViewSet(CachedListMixin, FieldProjectionMixin, DeltaSyncMixin, ConditionalGetMixin, StreamingListMixin, CustomViewSet):
     '''
     list:
     Retorna un conjunto de instancias del modelo `Indicator` (indicador).
@@ -392,7 +735,7 @@ class IndicatorViewSet(CustomViewSet):
     queryset = models.Indicator.objects.all()
     filterset_fields = ('code','ind_id')
 
-class VariableReportViewSet(CustomViewSet):
+class VariableReportViewSet(CachedListMixin, FieldProjectionMixin, DeltaSyncMixin, ConditionalGetMixin, StreamingListMixin, ColumnarExportMixin, BulkImportMixin, CustomViewSet):
     '''
     list:
     Retorna un conjunto de instancias del modelo `VariableReport` (reporte de variables).
@@ -412,6 +755,36 @@ class VariableReportViewSet(CustomViewSet):
     
     retorna sólamente el nombre de la epsa y el valor de la variable 1 y de los reportes del año 2017.
 
+    Las instancias se retornan en páginas de `page_size` instancias (500 por defecto, hasta 5000), ordenadas por EPSA, año y mes. La respuesta contiene los enlaces `next` y `previous` a las páginas siguiente y anterior y la lista `results` de instancias. Por ejemplo,
+
+        /api/reports/?year=2017&page_size=1000
+
+    Para obtener todas las instancias en una sola respuesta se puede añadir el parámetro `stream=1`. La respuesta es entonces la lista completa de instancias, sin paginar, que es enviada a medida que se lee de la base de datos. Por ejemplo,
+
+        /api/reports/?stream=1&year=2017
+
+    Para sincronizar sólo los cambios se puede añadir el parámetro `modified_since` (fecha ISO 8601 o segundos desde 1970), que retorna sólo las instancias modificadas desde esa fecha. Las instancias eliminadas desde esa fecha se obtienen en `/api/reports/deleted/`, con su llave primaria (`object_id`), los campos que la identifican (`key`) y la fecha de eliminación (`deleted`). Por ejemplo,
+
+        /api/reports/?modified_since=2019-06-01T00:00:00Z
+        /api/reports/deleted/?modified_since=2019-06-01T00:00:00Z
+
+    arrow:
+    Retorna las instancias en formato Arrow IPC (stream), listo para ser leído como un DataFrame, por ejemplo con `pyarrow.ipc.open_stream(...).read_pandas()`. Soporta los mismos parámetros de filtro que la lista y el parámetro `fields` para elegir las columnas. Por ejemplo,
+
+        /api/reports/arrow/?year=2017&fields=epsa,month,v1
+
+    parquet:
+    Retorna las instancias en formato Parquet, por ejemplo para `pandas.read_parquet`. Soporta los mismos parámetros de filtro que la lista y el parámetro `fields` para elegir las columnas. Por ejemplo,
+
+        /api/reports/parquet/?year=2017
+
+    long:
+    Retorna los valores de los reportes en formato largo: un objeto por reporte y variable con los campos `epsa`, `year`, `month`, `var_id`, `var_code`, `var_name`, `unit`, `var_type`, `value` y `type`, donde los datos de la variable se toman del modelo `Variable`. Los valores nulos se omiten.
+
+    El parámetro `vars` limita las variables, dadas por el nombre de su campo (`v3`) o su código; sin él se retornan todas. Soporta los mismos parámetros de filtro que la lista, además de `year__gte` y `year__lte`. La respuesta no es paginada y se envía a medida que se lee de la base de datos, también en formato CSV (`format=csv`). Por ejemplo,
+
+        /api/reports/long/?vars=v3,v5&year__gte=2015
+
     create:
     Este punto de acceso permite el ingreso de instancias del modelo `VariableReport` (reporte de variables) al sistema.
 
@@ -444,6 +817,27 @@ class VariableReportViewSet(CustomViewSet):
 
     Si los objetos ingresados no pasan el proceso de validación del sistema, las instancias no serán creadas y el error será retornado como respuesta al pedido.
 
+    Añadiendo el parámetro `dry_run=1`, el pedido no escribe nada y retorna el resultado que tendría cada objeto (`creado`, `actualizado`, `sin_cambios` o `ignorado`). Los objetos que actualizarían una instancia incluyen los cambios por campo en `cambios` (`{campo: [valor anterior, valor nuevo]}`). Por ejemplo,
+
+        POST /api/reports/?dry_run=1
+
+    bulk_import:
+    Este punto de acceso permite el ingreso masivo de reportes de variables desde un archivo NDJSON (un objeto JSON por línea) o CSV con encabezados, por ejemplo, para cargar varios años de reportes de todas las EPSA.
+
+    El cuerpo del pedido es leído de manera incremental y las filas son confirmadas en grupos de `chunk_size` filas (1000 por defecto). El tipo del cuerpo se indica con el header `Content-Type` (`text/csv` o `application/x-ndjson`). Por ejemplo,
+
+        POST /api/reports/import/?chunk_size=5000
+        Content-Type: text/csv
+
+        epsa,year,month,v1,v1_type,v2,v2_type,...
+        AAPOS,2014,,10738512.20,VA,,NR,...
+
+    Las columnas son las mismas que los campos del modelo: `epsa`, `year`, `month`, `v1`...`v51` y `v1_type`...`v51_type`. Las celdas vacías se ingresan como `null`.
+
+    La respuesta contiene el número de filas confirmadas, la última línea confirmada, el número de filas por resultado (`creado`, `actualizado`, `sin_cambios`, `ignorado`) y las líneas ignoradas. Si el archivo contiene un error, la carga se detiene y la respuesta indica hasta qué línea se confirmaron los datos.
+
+    Con el parámetro `dry_run=1` el archivo se procesa completo sin escribir nada y la respuesta contiene los resultados que tendría la carga.
+
     read:
     Retorna una instancia específica del modelo `VariableReport` (reporte de variables).
 
@@ -529,9 +923,23 @@ class VariableReportViewSet(CustomViewSet):
     '''
     serializer_class = serializers.VariableReportSerializer
     queryset = models.VariableReport.objects.all()
-    filterset_fields = ('epsa','year','month',)
-
-class IndicatorMeasurementViewSet(CustomViewSet):
+    filterset_fields = {'epsa': ['exact'], 'year': ['exact', 'gte', 'lte'], 'month': ['exact']}
+    pagination_class = KeysetPagination
+
+    @action(detail=False, methods=['get'])
+    def long(self, request):
+        names = [name.strip() for name in request.query_params.get('vars', '').split(',') if name.strip()]
+        queryset = self.filter_queryset(self.get_queryset())
+        numbers = unpivot.resolve_variables(queryset.model, names)
+        items = unpivot.iter_long(queryset, numbers)
+        if isinstance(getattr(request, 'accepted_renderer', None), CSVRenderer):
+            headers = OrderedDict((name, name) for name in unpivot.LONG_FIELDS)
+            response = StreamingHttpResponse(iter_csv(items, headers), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="variablereport_long.csv"'
+            return response
+        return StreamingHttpResponse(iter_json_array(items), content_type='application/json')
+
+class IndicatorMeasurementViewSet(CachedListMixin, FieldProjectionMixin, DeltaSyncMixin, ConditionalGetMixin, StreamingListMixin, ColumnarExportMixin, BulkImportMixin, CustomViewSet):
     '''
     list:
     Retorna un conjunto de instancias del modelo `IndicatorMeasurement` (medidad de indicadores).
@@ -550,7 +958,30 @@ class IndicatorMeasurementViewSet(CustomViewSet):
         /api/variables/?fields=epsa,ind1&year=2017
     
     retorna sólamente el nombre de la epsa y el valor del indicador 1 y del año 2017.
-    
+
+    Las instancias se retornan en páginas de `page_size` instancias (500 por defecto, hasta 5000), ordenadas por EPSA, año y mes. La respuesta contiene los enlaces `next` y `previous` a las páginas siguiente y anterior y la lista `results` de instancias. Por ejemplo,
+
+        /api/measurements/?year=2017&page_size=1000
+
+    Para obtener todas las instancias en una sola respuesta se puede añadir el parámetro `stream=1`. La respuesta es entonces la lista completa de instancias, sin paginar, que es enviada a medida que se lee de la base de datos. Por ejemplo,
+
+        /api/measurements/?stream=1&year=2017
+
+    Para sincronizar sólo los cambios se puede añadir el parámetro `modified_since` (fecha ISO 8601 o segundos desde 1970), que retorna sólo las instancias modificadas desde esa fecha. Las instancias eliminadas desde esa fecha se obtienen en `/api/measurements/deleted/`, con su llave primaria (`object_id`), los campos que la identifican (`key`) y la fecha de eliminación (`deleted`). Por ejemplo,
+
+        /api/measurements/?modified_since=2019-06-01T00:00:00Z
+        /api/measurements/deleted/?modified_since=2019-06-01T00:00:00Z
+
+    arrow:
+    Retorna las instancias en formato Arrow IPC (stream), listo para ser leído como un DataFrame, por ejemplo con `pyarrow.ipc.open_stream(...).read_pandas()`. Soporta los mismos parámetros de filtro que la lista y el parámetro `fields` para elegir las columnas. Por ejemplo,
+
+        /api/measurements/arrow/?year=2017&fields=epsa,month,v1
+
+    parquet:
+    Retorna las instancias en formato Parquet, por ejemplo para `pandas.read_parquet`. Soporta los mismos parámetros de filtro que la lista y el parámetro `fields` para elegir las columnas. Por ejemplo,
+
+        /api/measurements/parquet/?year=2017
+
     create:
     Este punto de acceso permite el ingreso de instancias del modelo `IndicatorMeasurement` (medida de indicadores) al sistema.
 
@@ -581,6 +1012,28 @@ class IndicatorMeasurementViewSet(CustomViewSet):
     Añadiría las instancias correspondientes a los indicadores calculadors para las EPSAs 6 DE OCTUBRE y AAPOS de los años 2017 y 2014 respectivamente.
 
     Si los objetos ingresados no pasan el proceso de validación del sistema, las instancias no serán creadas y el error será retornado como respuesta al pedido.
+
+    Añadiendo el parámetro `dry_run=1`, el pedido no escribe nada y retorna el resultado que tendría cada objeto (`creado`, `actualizado`, `sin_cambios` o `ignorado`). Los objetos que actualizarían una instancia incluyen los cambios por campo en `cambios` (`{campo: [valor anterior, valor nuevo]}`). Por ejemplo,
+
+        POST /api/measurements/?dry_run=1
+
+    bulk_import:
+    Este punto de acceso permite el ingreso masivo de medidas de indicadores desde un archivo NDJSON (un objeto JSON por línea) o CSV con encabezados.
+
+    El cuerpo del pedido es leído de manera incremental y las filas son confirmadas en grupos de `chunk_size` filas (1000 por defecto). El tipo del cuerpo se indica con el header `Content-Type` (`text/csv` o `application/x-ndjson`). Por ejemplo,
+
+        POST /api/measurements/import/
+        Content-Type: application/x-ndjson
+
+        {"epsa": "AAPOS", "year": 2014, "month": null, "ind1": 98.70, "ind2": 85.38}
+        {"epsa": "6 DE OCTUBRE", "year": 2017, "month": null, "ind1": 51.75}
+
+    Las columnas son las mismas que los campos del modelo: `epsa`, `year`, `month` y `ind1`...`ind32`. Las celdas vacías se ingresan como `null`.
+
+    La respuesta contiene el número de filas confirmadas, la última línea confirmada, el número de filas por resultado (`creado`, `actualizado`, `sin_cambios`, `ignorado`) y las líneas ignoradas. Si el archivo contiene un error, la carga se detiene y la respuesta indica hasta qué línea se confirmaron los datos.
+
+    Con el parámetro `dry_run=1` el archivo se procesa completo sin escribir nada y la respuesta contiene los resultados que tendría la carga.
+
     read:
     Retorna una instancia específica del modelo `IndicatorMeasurement` (medida de indicadores).
 
@@ -668,4 +1121,39 @@ class IndicatorMeasurementViewSet(CustomViewSet):
     serializer_class = serializers.IndicatorMeasurementSerializer
     queryset = models.IndicatorMeasurement.objects.all()
     filterset_fields = ('epsa','year','month',)
+    pagination_class = KeysetPagination
+
+class ImportJobViewSet(FieldProjectionMixin, viewsets.ReadOnlyModelViewSet):
+    '''
+    list:
+    Retorna las cargas masivas en segundo plano del usuario (todas las cargas para administradores).
 
+    Cualquier carga masiva (una lista de objetos) a `/api/reports/`, `/api/measurements/`, `/api/poas/`, `/api/sarhs/`, etc. puede ser ejecutada en segundo plano añadiendo el parámetro `async=1`. Por ejemplo,
+
+        POST /api/reports/?async=1
+
+    responde inmediatamente con el estado `202` y el identificador de la carga:
+
+        {
+            "job": 12,
+            "status": "pendiente",
+            "url": "http://.../api/jobs/12/"
+        }
+
+    Las cargas son ejecutadas por el comando `python manage.py importworker`.
+
+    Soporta el parámetro de filtro `status` (`pendiente`, `en_proceso`, `completado` o `fallido`). El reporte por fila puede ser omitido con el parámetro `fields!=report`.
+
+    read:
+    Retorna el estado de una carga masiva: número de filas (`total_rows`), filas procesadas (`processed_rows`), filas por segundo (`rows_per_second`) y, al terminar, el reporte por fila (`report`) con los resultados `creado`, `actualizado`, `sin_cambios` o `ignorado`.
+    '''
+    serializer_class = serializers.ImportJobSerializer
+    queryset = models.ImportJob.objects.all()
+    filterset_fields = ('status',)
+
+    def get_queryset(self):
+        queryset = super(ImportJobViewSet, self).get_queryset()
+        user = getattr(self.request, 'user', None)
+        if user is None or not user.is_superuser:
+            queryset = queryset.filter(user_id=getattr(user, 'pk', None))
+        return queryset
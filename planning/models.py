@@ -1,6 +1,7 @@
 import datetime
 from django.db import models
-from performance.models import EPSA, BaseModel
+from performance.models import BaseModel
+from performance.epsa_cache import epsa_category, epsa_state
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.forms import ValidationError
 
@@ -16,6 +17,8 @@ state_code_to_name = {
     'PA': 'Pando',
 }
 
+EXPENSE_TYPE_ERROR = 'Un POA no puede tener más de un tipo de planilla de gastos (cooperativa, municipal, ...).'
+
 class POA(BaseModel):
     '''
     Modelo representando un Presupuesto Operativo Anual (POA) de una EPSA.
@@ -193,7 +196,7 @@ class POA(BaseModel):
 
     def clean(self, *args, **kwargs):
         if hasattr(self, 'coop_expense') and hasattr(self, 'muni_expense'):
-            raise ValidationError('Un POA no puede tener más de un tipo de planilla de gastos (cooperativa, municipal, ...).', code='invalid')
+            raise ValidationError(EXPENSE_TYPE_ERROR, code='invalid')
         super(POA, self).clean(*args, **kwargs)
 
     def save(self, *args, **kwargs):
@@ -203,19 +206,15 @@ class POA(BaseModel):
     def __str__(self):
         return f'{self.epsa}-{self.year}-{self.order}'
     def get_category(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            cat = str(rel_epsa[0].category)
-            if cat in ['A','B','C','D']:
-                return cat
+        cat = str(epsa_category(self.epsa))
+        if cat in ['A','B','C','D']:
+            return cat
         return ''
     get_category.short_description = 'categoría'
     def get_state(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            state_code = str(rel_epsa[0].state)
-            if state_code in state_code_to_name.keys():
-                return state_code_to_name[state_code]
+        state_code = str(epsa_state(self.epsa))
+        if state_code in state_code_to_name.keys():
+            return state_code_to_name[state_code]
         return ''
     get_state.short_description = 'departamento'
 
@@ -384,19 +383,15 @@ class Plan(BaseModel):
     def __str__(self):
         return f'{self.epsa}-{self.year}-{self.plan_type}'
     def get_category(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            cat = str(rel_epsa[0].category)
-            if cat in ['A','B','C','D']:
-                return cat
+        cat = str(epsa_category(self.epsa))
+        if cat in ['A','B','C','D']:
+            return cat
         return ''
     get_category.short_description = 'categoría'
     def get_state(self):
-        rel_epsa = EPSA.objects.filter(code=self.epsa)
-        if rel_epsa:
-            state_code = str(rel_epsa[0].state)
-            if state_code in state_code_to_name.keys():
-                return state_code_to_name[state_code]
+        state_code = str(epsa_state(self.epsa))
+        if state_code in state_code_to_name.keys():
+            return state_code_to_name[state_code]
         return ''
     get_state.short_description = 'departamento'
 
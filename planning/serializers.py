@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from planning import models
 from performance.models import EPSA
+from performance.serializers import CustomListModelSerializer
+from performance.upsert import BulkUpsert, NOT_IDENTIFIABLE, collect_children, replace_children
+from django.db import transaction
 from drf_queryfields import QueryFieldsMixin
 from collections import OrderedDict
 from rest_framework.relations import PKOnlyObject
@@ -16,45 +19,63 @@ class MuniExpenseSerializer(QueryFieldsMixin, serializers.ModelSerializer):
         model = models.MuniExpense
         exclude = ('id','poa',)
 
-class POAListSerializer(serializers.ListSerializer):
-    def is_valid(self,raise_exception=False):
-        if not hasattr(self, '_validated_data'):
-            self._validated_data = self.initial_data
-            self._errors = {}
-        return True
+class POAListSerializer(CustomListModelSerializer):
+    '''
+    Carga por lote de POAs, que no pasa por `POA.save()`. Las reglas de `full_clean` se aplican así:
+    `clean_fields` con la validación por columnas y `BulkUpsert(clean_fields=True)`, `clean` (un solo tipo de planilla de gastos)
+    con `check_expense_types` y `validate_unique` con la llave `epsa`, `year`, `order`, que identifica la instancia a actualizar.
+    '''
+    nested = {'coop_expense': models.CoopExpense, 'muni_expense': models.MuniExpense}
 
     def create(self, validated_data):
-        ret = []
+        expenses = []
         for data_dict in validated_data:
-            epsa = data_dict.get('epsa')
-            year = data_dict.get('year')
-            order = data_dict.get('order')
-            coop_data = data_dict.pop('coop_expense', None)
-            muni_data = data_dict.pop('muni_expense', None)
-
-            if not all([epsa,year,order,]):
-                ret.append({'ignorado':{'no_identificable':'No se proporcionaron todos los campos necesarios para identificar la instancia de manera única.'}})
+            if isinstance(data_dict, dict):
+                expenses.append((data_dict.pop('coop_expense', None), data_dict.pop('muni_expense', None)))
+            else:
+                expenses.append((None, None))
+
+        upsert = BulkUpsert(models.POA, validated_data, ['epsa','year','order',], batch_size=self.batch_size, errors=self.row_errors, clean_fields=True)
+        for row in upsert.pending_rows:
+            if not all(row['key']):
+                upsert.ignore(row, 'no_identificable', NOT_IDENTIFIABLE)
+
+        with transaction.atomic():
+            upsert.existing = upsert.fetch_existing()
+            self.check_expense_types(upsert, expenses)
+            upsert.resolve()
+            coop_expenses = collect_children(upsert, [[c] if isinstance(c, dict) and c else None for c, m in expenses], models.CoopExpense, 'poa', 'coop_expense')
+            muni_expenses = collect_children(upsert, [[m] if isinstance(m, dict) and m else None for c, m in expenses], models.MuniExpense, 'poa', 'muni_expense')
+            if self.context.get('dry_run'):
+                return upsert.report(diffs=True)
+            upsert.save()
+            replace_children(models.CoopExpense, 'poa', coop_expenses, self.batch_size)
+            replace_children(models.MuniExpense, 'poa', muni_expenses, self.batch_size)
+        return upsert.report()
+
+    def check_expense_types(self, upsert, expenses):
+        '''
+        Versión por lote de la regla de `POA.clean`: ignora los POAs que terminarían con más de un tipo de planilla de gastos.
+        '''
+        poa_ids = [poa.pk for poa in upsert.existing.values()]
+        expense_types = {}
+        for poa_id in models.CoopExpense.objects.filter(poa__in=poa_ids).values_list('poa_id', flat=True):
+            expense_types[poa_id] = {'coop'}
+        for poa_id in models.MuniExpense.objects.filter(poa__in=poa_ids).values_list('poa_id', flat=True):
+            expense_types.setdefault(poa_id, set()).add('muni')
+
+        batch_types = {}
+        for row, (coop_data, muni_data) in zip(upsert.rows, expenses):
+            if row['action'] == 'ignorado':
                 continue
-            qs = models.POA.objects.filter(epsa=epsa,year=year,order=order)
-            if qs.count() > 0:
-                poa = qs[0]
-                qs.update(**data_dict)
-                ret_key = 'actualizado'
+            existing = upsert.existing.get(row['key'])
+            types = batch_types.get(row['key'], expense_types.get(existing.pk, set()) if existing else set())
+            types = types | {t for t, data in (('coop', coop_data), ('muni', muni_data)) if data}
+            if len(types) > 1:
+                upsert.ignore(row, 'tipo_de_gastos', models.EXPENSE_TYPE_ERROR)
             else:
-                poa = models.POA.objects.create(**data_dict)
-                ret_key = 'creado'
-            if coop_data:
-                models.CoopExpense.objects.filter(poa=poa).delete()
-                if coop_data.get('poa'):
-                    del coop_data['poa']
-                models.CoopExpense.objects.create(poa=poa,**coop_data)
-            if muni_data:
-                models.MuniExpense.objects.filter(poa=poa).delete()
-                if muni_data.get('poa'):
-                    del muni_data['poa']
-                models.MuniExpense.objects.create(poa=poa,**muni_data)
-            ret.append({ret_key: data_dict})
-        return ret
+                batch_types[row['key']] = types
+
 class POASerializer(QueryFieldsMixin, serializers.ModelSerializer):
     coop_expense = CoopExpenseSerializer(required=False)
     muni_expense = MuniExpenseSerializer(required=False)
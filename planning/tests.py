@@ -1,3 +1,163 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from performance.cache import response_cache, versions_cache
+from performance.models import Tombstone
+from performance.upsert import BulkUpsert
+from planning.models import EXPENSE_TYPE_ERROR, POA, CoopExpense, MuniExpense
+from planning.views import POAViewSet
 
-# Create your tests here.
+
+class POABulkTest(TransactionTestCase):
+    def setUp(self):
+        response_cache().clear()
+        versions_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@aaps.gob.bo', 'clave'))
+
+    def post(self, rows, url='/api/poas/'):
+        response = self.client.post(url, rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_nested_expenses(self):
+        report = self.post([{'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': 10}}])
+        self.assertIn('creado', report[0])
+        poa = POA.objects.get()
+        self.assertEqual(poa.coop_expense.costos_operacion, 10)
+
+        report = self.post([{'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': 10}}])
+        self.assertIn('sin_cambios', report[0])
+        report = self.post([{'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': 20}}])
+        self.assertIn('actualizado', report[0])
+        self.assertEqual(CoopExpense.objects.get().costos_operacion, 20)
+
+    def test_expense_type_rule(self):
+        self.post([{'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': 10}}])
+        report = self.post([
+            {'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'muni_expense': {'costos_operacion': 10}},
+            {'epsa': 'EPSA2', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': 1}, 'muni_expense': {'costos_operacion': 1}},
+        ])
+        self.assertEqual(report[0], {'ignorado': {'tipo_de_gastos': EXPENSE_TYPE_ERROR}})
+        self.assertEqual(report[1], {'ignorado': {'tipo_de_gastos': EXPENSE_TYPE_ERROR}})
+        self.assertFalse(MuniExpense.objects.exists())
+
+    def test_invalid_rows(self):
+        report = self.post([{'epsa': 'EPSA1', 'year': 2018, 'order': 9}, {'year': 2018, 'order': 1}])
+        self.assertIn('order', report[0]['ignorado']['invalido'])
+        self.assertIn('no_identificable', report[1]['ignorado'])
+
+    def test_clean_fields(self):
+        rows = [{'epsa': 'EPSA1', 'year': 1800, 'order': 1}]
+        report = BulkUpsert(POA, rows, ['epsa', 'year', 'order'], errors=[None], clean_fields=True).run()
+        self.assertIn('year', report[0]['ignorado']['invalido'])
+        self.assertFalse(POA.objects.exists())
+
+    def test_dry_run(self):
+        self.post([{'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': 10}}])
+        response = self.client.post('/api/poas/?dry_run=1', [
+            {'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': 20}},
+            {'epsa': 'EPSA2', 'year': 2018, 'order': 1},
+        ], format='json')
+        self.assertTrue(response.data['simulacion'])
+        results = response.data['resultados']
+        self.assertEqual(results[0]['cambios']['coop_expense'][1], [{'costos_operacion': 20}])
+        self.assertIn('creado', results[1])
+        self.assertEqual(POA.objects.count(), 1)
+        self.assertEqual(CoopExpense.objects.get().costos_operacion, 10)
+
+
+class POAStreamTest(TransactionTestCase):
+    def setUp(self):
+        response_cache().clear()
+        versions_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@aaps.gob.bo', 'clave'))
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        return json.loads(content.decode('utf-8')), len(queries)
+
+    def test_nested_queries(self):
+        rows = [{'epsa': f'EPSA{i}', 'year': 2018, 'order': 1, 'coop_expense': {'costos_operacion': i}} for i in range(20)]
+        self.client.post('/api/poas/', rows + [{'epsa': 'EPSA99', 'year': 2018, 'order': 1}], format='json')
+        streamed, stream_queries = self.get('/api/poas/?stream=1')
+        page, page_queries = self.get('/api/poas/')
+        self.assertEqual(streamed, page['results'])
+        by_epsa = {poa['epsa']: poa for poa in streamed}
+        self.assertEqual(by_epsa['EPSA5']['coop_expense']['costos_operacion'], 5)
+        self.assertNotIn('coop_expense', by_epsa['EPSA99'])
+        self.assertLess(stream_queries, 10)
+        self.assertLess(page_queries, 10)
+
+
+class POAFieldProjectionTest(TransactionTestCase):
+    def setUp(self):
+        response_cache().clear()
+        versions_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@aaps.gob.bo', 'clave'))
+
+    def test_related_fields(self):
+        view = POAViewSet(action_map={'get': 'list'}, format_kwarg=None, kwargs={})
+        view.request = view.initialize_request(APIRequestFactory().get('/api/poas/?fields=epsa,coop_expense'))
+        names, defer = view.get_queryset().query.deferred_loading
+        self.assertFalse(defer)
+        self.assertEqual(names, {'id', 'epsa', 'year', 'order', 'modified'})
+
+        self.client.post('/api/poas/', [{'epsa': 'EPSA1', 'year': 2018, 'order': 1, 'anc': 5, 'coop_expense': {'costos_operacion': 10}}], format='json')
+        response = self.client.get('/api/poas/?fields=epsa,coop_expense')
+        poa, = response.json()['results']
+        self.assertEqual(sorted(poa), ['coop_expense', 'epsa'])
+        self.assertEqual((poa['epsa'], poa['coop_expense']['costos_operacion']), ('EPSA1', 10))
+
+
+class POAConditionalGetTest(TransactionTestCase):
+    def setUp(self):
+        response_cache().clear()
+        versions_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@aaps.gob.bo', 'clave'))
+        self.poa = POA.objects.create(epsa='EPSA1', year=2018, order=1)
+
+    def test_list(self):
+        response = self.client.get('/api/poas/')
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get('/api/poas/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/poas/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get('/api/poas/?year=2019', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        POA.objects.create(epsa='EPSA2', year=2018, order=1)
+        changed = self.client.get('/api/poas/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_list_if_modified_since(self):
+        POA.objects.create(epsa='EPSA2', year=2018, order=1)
+        POA.objects.update(modified=timezone.now() - timedelta(hours=1))
+        last_modified = self.client.get('/api/poas/?year=2018')['Last-Modified']
+        self.assertEqual(self.client.get('/api/poas/?year=2018', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        POA.objects.get(epsa='EPSA2').delete()
+        self.assertEqual(self.client.get('/api/poas/?year=2018', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+        Tombstone.objects.update(deleted=timezone.now() - timedelta(hours=1))
+        last_modified = self.client.get('/api/poas/?year=2018')['Last-Modified']
+        self.poa.year = 2019
+        self.poa.save()
+        response = self.client.get('/api/poas/?year=2018', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual((response.status_code, response.json()['results']), (200, []))
+
+    def test_retrieve(self):
+        url = f'/api/poas/{self.poa.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.poa.anc = 10
+        self.poa.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
@@ -1,22 +1,43 @@
 from rest_framework import viewsets
 from planning import models, serializers
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from performance import jobs
+from performance.pagination import KeysetPagination
+from performance.upsert import DEFAULT_BATCH_SIZE
+from performance.views import ColumnarExportMixin, ConditionalGetMixin, DeltaSyncMixin, FieldProjectionMixin, StreamingListMixin
 from rest_framework import status
 
 class CustomViewSet(viewsets.ModelViewSet):
+    upsert_batch_size = DEFAULT_BATCH_SIZE
+
     def get_serializer(self, *args, **kwargs):
         if isinstance(kwargs.get('data', {}), list):
             kwargs['many'] = True
         return super(CustomViewSet, self).get_serializer(*args, **kwargs)
 
+    def get_serializer_context(self):
+        context = super(CustomViewSet, self).get_serializer_context()
+        context['dry_run'] = jobs.is_dry_run(self.request)
+        context['batch_size'] = self.upsert_batch_size
+        return context
+
     def create(self, request, *args, **kwargs):
+        if jobs.is_dry_run(request):
+            serializer = self.get_serializer(data=request.data if isinstance(request.data, list) else [request.data])
+            serializer.is_valid(raise_exception=False)
+            return Response({'simulacion': True, 'resultados': serializer.save()}, status=status.HTTP_200_OK)
+        if jobs.is_async_request(request):
+            job = jobs.enqueue(request, self.get_serializer_class(), self.get_serializer_context())
+            url = reverse('importjob-detail', kwargs={'pk': job.pk}, request=request)
+            return Response({'job': job.pk, 'status': job.status, 'url': url}, status=status.HTTP_202_ACCEPTED)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=False)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.initial_data)
         return Response(serializer.instance, status=status.HTTP_201_CREATED)
 
-class POAViewSet(CustomViewSet):
+class POAViewSet(FieldProjectionMixin, DeltaSyncMixin, ConditionalGetMixin, StreamingListMixin, ColumnarExportMixin, CustomViewSet):
     '''
     list:
     Retorna un conjunto de instancias del modelo de planificación `POA`.
@@ -35,6 +56,25 @@ class POAViewSet(CustomViewSet):
     
     retorna sólamente la EPSA y el año de todas los POAs en el sistema.
 
+    Las instancias se retornan en páginas de `page_size` instancias (500 por defecto, hasta 5000), ordenadas por EPSA, año y orden. La respuesta contiene los enlaces `next` y `previous` a las páginas siguiente y anterior y la lista `results` de instancias. Por ejemplo,
+
+        /api/poas/?year=2017&page_size=1000
+
+    Para sincronizar sólo los cambios se puede añadir el parámetro `modified_since` (fecha ISO 8601 o segundos desde 1970), que retorna sólo las instancias modificadas desde esa fecha. Las instancias eliminadas desde esa fecha se obtienen en `/api/poas/deleted/`, con su llave primaria (`object_id`), los campos que la identifican (`key`) y la fecha de eliminación (`deleted`). Por ejemplo,
+
+        /api/poas/?modified_since=2019-06-01T00:00:00Z
+        /api/poas/deleted/?modified_since=2019-06-01T00:00:00Z
+
+    arrow:
+    Retorna los POAs (sin las planillas de gastos) en formato Arrow IPC (stream). Soporta los mismos parámetros de filtro que la lista y el parámetro `fields` para elegir las columnas. Por ejemplo,
+
+        /api/poas/arrow/?year=2018
+
+    parquet:
+    Retorna los POAs (sin las planillas de gastos) en formato Parquet. Soporta los mismos parámetros de filtro que la lista y el parámetro `fields` para elegir las columnas. Por ejemplo,
+
+        /api/poas/parquet/?year=2018
+
     create:
     Este punto de acceso permite el ingreso de instancias del modelo de planificación `POA` al sistema.
 
@@ -170,10 +210,11 @@ class POAViewSet(CustomViewSet):
     eliminaría la instancia de `POA` con índice 8.
     '''
     serializer_class = serializers.POASerializer
-    queryset = models.POA.objects.all()
+    queryset = models.POA.objects.prefetch_related('coop_expense', 'muni_expense')
     filterset_fields = ('epsa','year','order',)
+    pagination_class = KeysetPagination
 
-class PlanViewSet(viewsets.ModelViewSet):
+class PlanViewSet(FieldProjectionMixin, DeltaSyncMixin, ConditionalGetMixin, StreamingListMixin, viewsets.ModelViewSet):
     '''
     list:
     Retorna un conjunto de instancias del modelo de planificación `Plan` (PDQ/PTDS).
@@ -309,7 +350,7 @@ class PlanViewSet(viewsets.ModelViewSet):
     eliminaría la instancia de `Plan` con índice 8.
     '''
     serializer_class = serializers.PlanSerializer
-    queryset = models.Plan.objects.all()
+    queryset = models.Plan.objects.prefetch_related('goals')
     filterset_fields = ('epsa','year','plan_type',)
 
 
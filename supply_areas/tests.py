@@ -1,3 +1,62 @@
-from django.test import TestCase
+import json
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from performance import epsa_cache
+from performance.cache import response_cache, versions_cache
+from performance.models import EPSA
+from supply_areas.models import SupplyArea
 
-# Create your tests here.
+
+def feature(epsa, x=-65.7):
+    geometry = {'type': 'MultiPolygon', 'coordinates': [[[[x, -19.6], [x + 0.1, -19.6], [x + 0.1, -19.5], [x, -19.6]]]]}
+    return {'type': 'Feature', 'properties': {'epsa': epsa, 'area': 1.5}, 'geometry': geometry}
+
+
+class SupplyAreaTest(TransactionTestCase):
+    def setUp(self):
+        response_cache().clear()
+        versions_cache().clear()
+        epsa_cache._epsas = (None, {})
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@aaps.gob.bo', 'clave'))
+
+    def post(self, document):
+        return self.client.post('/api/supply_areas/', json.dumps(document), content_type='application/json')
+
+    def test_create(self):
+        features = [feature(f'EPSA{i}') for i in range(450)]
+        features[5]['properties'] = {}
+        response = self.post({'type': 'FeatureCollection', 'crs': {'type': 'link'}, 'features': features})
+        self.assertEqual(response.data, {'created': 449, 'failed': 1, 'failed_indexes': [5]})
+        self.assertEqual(SupplyArea.objects.count(), 449)
+
+    def test_truncated_body(self):
+        body = json.dumps({'type': 'FeatureCollection', 'features': [feature('EPSA1'), feature('EPSA2')]})
+        response = self.client.post('/api/supply_areas/', body[:-20], content_type='application/json')
+        self.assertIn('error', response.data)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_list_filters(self):
+        EPSA.objects.create(code='EPSA1', name='EPSA 1', state='LP')
+        EPSA.objects.create(code='EPSA2', name='EPSA 2', state='SC')
+        self.post({'type': 'FeatureCollection', 'features': [feature('EPSA1'), feature('EPSA2')]})
+        epsas = lambda url: [feat['properties']['epsa'] for feat in self.client.get(url).json()['features']]
+        self.assertEqual(epsas('/api/supply_areas/?state=LP'), ['EPSA1'])
+        self.assertEqual(epsas('/api/supply_areas/?epsa=EPSA2'), ['EPSA2'])
+        self.post({'type': 'FeatureCollection', 'features': [feature('EPSA1', -65.0)]})
+        self.assertEqual(epsas('/api/supply_areas/?state=LP'), ['EPSA1', 'EPSA1'])
+
+    @override_settings(EPSA_CACHE_CHECK_INTERVAL=0)
+    def test_list_cache(self):
+        epsa = EPSA.objects.create(code='EPSA1', name='EPSA 1', state='LP')
+        self.post({'type': 'FeatureCollection', 'features': [feature('EPSA1')]})
+        first = self.client.get('/api/supply_areas/?state=LP')
+        self.assertEqual(len(first.json()['features']), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/supply_areas/?state=LP').content, first.content)
+        self.post({'type': 'FeatureCollection', 'features': [feature('EPSA1', -65.0)]})
+        self.assertEqual(len(self.client.get('/api/supply_areas/?state=LP').json()['features']), 2)
+        epsa.state = 'SC'
+        epsa.save()
+        self.assertEqual(self.client.get('/api/supply_areas/?state=LP').json()['features'], [])
@@ -1,17 +1,27 @@
 import json
-from django.core import serializers
+from django.core.serializers import serialize
+from django.db import DatabaseError, transaction
 from supply_areas.models import SupplyArea
+from performance.models import EPSA
+from performance.epsa_cache import epsa_codes
+from performance.signals import bulk_change
+from performance.streaming import FeatureCollectionReader
+from performance.upsert import model_props
+from performance.views import CachedListMixin
 from rest_framework import viewsets, response, serializers
 
+INSERT_CHUNK_SIZE = 200
+
 class SupplyAreaSerializer(serializers.ModelSerializer):
     class Meta:
         model = SupplyArea
         fields = '__all__'
 
-class SupplyAreaViewSet(viewsets.ModelViewSet):
+class SupplyAreaViewSet(CachedListMixin, viewsets.ModelViewSet):
     
     queryset = SupplyArea.objects.all()
     serializer_class = SupplyAreaSerializer
+    cache_models = (SupplyArea, EPSA)
     '''
     list:
     Retorna un conjunto de instancias del modelo `SupplyAreas` (áreas de prestación de servicios).
@@ -141,17 +151,26 @@ class SupplyAreaViewSet(viewsets.ModelViewSet):
 
     Añadiría las áreas de prestación de servicios de las EPSAs AAPOS y COOAPASH al sistema. 
 
+    El cuerpo del pedido es leído de manera incremental y las áreas son guardadas en grupos, por lo que no existe un límite práctico para el tamaño del GeoJSON ingresado.
+    La respuesta es un resumen con el número de áreas creadas (`created`), el número de áreas fallidas (`failed`) y las posiciones de estas en la lista de "features" (`failed_indexes`). Por ejemplo,
+
+        {
+            "created": 2,
+            "failed": 0,
+            "failed_indexes": []
+        }
+
     Si los objetos ingresados no pasan el proceso de validación del sistema, las instancias no serán creadas y el error será retornado como respuesta al pedido.
     '''
-    def list(self, request):
+    def uncached_list(self, request):
         queryset = SupplyArea.objects.all()
 
         state = request.query_params.get('state', None)
         epsa_code = request.query_params.get('epsa', None)
         if state is not None:
-            queryset = queryset.filter(epsa__state=state)
+            queryset = queryset.filter(epsa__in=epsa_codes(state=state))
         if epsa_code is not None:
-            queryset = queryset.filter(epsa__code=epsa_code)
+            queryset = queryset.filter(epsa=epsa_code)
             
         options = dict(
             properties=['epsa',],
@@ -165,7 +184,7 @@ class SupplyAreaViewSet(viewsets.ModelViewSet):
             with_modelname=False,
             ensure_ascii=False
         )
-        data = json.loads(serializers.serialize('geojson', queryset, **options))
+        data = json.loads(serialize('geojson', queryset, **options))
         for feat in data['features']:
             del feat['id']
             if 'model' in feat['properties']:
@@ -174,11 +193,45 @@ class SupplyAreaViewSet(viewsets.ModelViewSet):
         return response.Response(data)
 
     def create(self, request):
-        try:
-            json_str = request.body.decode('utf-8')
-            for serobj in serializers.deserialize('geojson', json_str, model_name='supply_areas.SupplyArea'):
-                serobj.save()
-            return response.Response(dict(created_obj=json_str))
-        except Exception as e:
-            return response.Response(dict(error=str(e)))
+        summary = dict(created=0, failed=0, failed_indexes=[])
+        if request.stream is None:
+            summary['error'] = 'El cuerpo del pedido está vacío.'
+            return response.Response(summary)
 
+        chunk = []
+        try:
+            for i, feature in enumerate(FeatureCollectionReader(request.stream)):
+                instance = self.feature_to_instance(feature)
+                if instance is None:
+                    summary['failed'] += 1
+                    summary['failed_indexes'].append(i)
+                    continue
+                chunk.append((i, instance))
+                if len(chunk) >= INSERT_CHUNK_SIZE:
+                    self.save_chunk(chunk, summary)
+                    chunk = []
+        except ValueError as e:
+            summary['error'] = str(e)
+        self.save_chunk(chunk, summary)
+        return response.Response(summary)
+
+    def feature_to_instance(self, feature):
+        if not isinstance(feature, dict) or not isinstance(feature.get('properties'), dict):
+            return None
+        props = model_props(SupplyArea, feature['properties'], exclude=('geom',))
+        epsa = props.get('epsa')
+        if not epsa or len(str(epsa)) > SupplyArea._meta.get_field('epsa').max_length:
+            return None
+        return SupplyArea(geom=feature.get('geometry'), **props)
+
+    def save_chunk(self, chunk, summary):
+        if not chunk:
+            return
+        try:
+            with transaction.atomic():
+                SupplyArea.objects.bulk_create([instance for i, instance in chunk])
+                bulk_change.send(sender=SupplyArea)
+            summary['created'] += len(chunk)
+        except DatabaseError:
+            summary['failed'] += len(chunk)
+            summary['failed_indexes'].extend(i for i, instance in chunk)